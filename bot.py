@@ -5,10 +5,12 @@ import discord
 from discord.ext import commands
 import asyncio
 from asyncpg.pool import Pool
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict, Set
 from cogs.utils import context
 from cogs.utils.db import Table
 from cogs.utils.messages import on_join
+from cogs.utils.roles import RoleQueue
+from cogs.utils.users import UserNames
 import os
 from platform import node
 import datetime
@@ -44,16 +46,45 @@ class ServerConfigs:
     def __init__(self, bot, guild_id, row=None):
         self.bot: Curator = bot
         self.guild: discord.Guild = self.get_guild(guild_id)
+        self.count_channel_ids: Set[int] = set()  # IDs of the channels in count_channels
+        self._is_count_channel: Dict[int, bool] = {}  # channel ID -> whether counts can be played there
         row = row or {'logchannel': None, 'chartroles': [], 'ticket_category': None, 'count_channels': [],
                       'self_roles': [], 'censor_words': [], 'censor_message': None}
         self.logchannel: Optional[discord.TextChannel] = self.get_channel(row['logchannel'])
         self.chartroles: List[discord.Role] = sorted(list(filter(None, [self.get_role(role_id) for role_id in row['chartroles']])), reverse=True)
         self.ticket_category: Optional[discord.CategoryChannel] = self.get_channel(row['ticket_category'])
         self.count_channels: List[discord.TextChannel] = list(filter(None, [self.get_channel(channel_id) for channel_id in row['count_channels']]))
+        self.count_channel_ids = {channel.id for channel in self.count_channels}
         self.self_roles: List[discord.Role] = list(filter(None, [self.get_role(role_id) for role_id in row['self_roles']]))
         self.censor_words: List[str] = row['censor_words']
         self.censor_message: Optional[str] = row['censor_message']
 
+    def add_count_channel(self, channel: discord.TextChannel):
+        self.count_channels.append(channel)
+        self.count_channel_ids.add(channel.id)
+        self._is_count_channel.clear()
+
+    def remove_count_channel(self, channel: discord.TextChannel):
+        self.count_channels.remove(channel)
+        self.count_channel_ids.discard(channel.id)
+        self._is_count_channel.clear()
+
+    def is_count_channel(self, channel: discord.TextChannel) -> bool:
+        """Check if counts can be played in a channel, the answer is cached until the channel is updated."""
+        try:
+            return self._is_count_channel[channel.id]
+        except KeyError:
+            if self.count_channel_ids:
+                result = channel.id in self.count_channel_ids
+            else:
+                result = 'count' in channel.name.lower()
+            self._is_count_channel[channel.id] = result
+            return result
+
+    def invalidate_channel(self, channel_id: int):
+        """Forget what is cached about a channel, used when it gets updated or deleted."""
+        self._is_count_channel.pop(channel_id, None)
+
     def get_guild(self, guild_id) -> discord.Guild:
         guild = self.bot.get_guild(guild_id)
         if not guild:
@@ -91,6 +122,8 @@ class Curator(commands.Bot):
         self.server_configs = {}
         self.dm_dump = dm_dump
         self.last_dm = None
+        self.user_names = UserNames(self)
+        self.role_queue = RoleQueue(self)
 
         self._load_initial_extensions()
 
@@ -167,6 +200,14 @@ class Curator(commands.Bot):
         await self.pool.fetchval(query, guild.id)
         del (self.server_configs[guild.id])
 
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if after.guild.id in self.server_configs:
+            self.server_configs[after.guild.id].invalidate_channel(after.id)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if channel.guild.id in self.server_configs:
+            self.server_configs[channel.guild.id].invalidate_channel(channel.id)
+
     async def on_message(self, message: discord.Message):
         if message.channel.type == discord.ChannelType.private:
             if message.author == self.user:
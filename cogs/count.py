@@ -1,6 +1,7 @@
+import asyncio
 import datetime
-from collections import OrderedDict
-from typing import Optional
+from typing import Optional, Sequence, Iterator
+import itertools
 import re
 
 import asyncpg
@@ -32,6 +33,54 @@ class Counts(db.Table):
 
     type = db.Column(db.String, default="normal")
 
+    guild_score = db.Index('guild', 'score DESC')
+    guild_ended_at = db.Index('guild', '(started_at + duration) DESC')
+
+
+class CountContributions(db.Table, table_name='count_contributions'):
+    count_id = db.Column(db.ForeignKey(table='counts', column='id', sql_type=db.Integer()), primary_key=True)
+    user_id = db.Column(db.Integer(big=True), primary_key=True)
+    amount = db.Column(db.Integer, default=0)
+
+    user_counts = db.Index('user_id', 'count_id')
+
+
+class RunningCounts(db.Table, table_name='running_counts'):
+    channel = db.Column(db.Integer(big=True), primary_key=True)
+    guild = db.Column(db.Integer(big=True))
+
+    started_by = db.Column(db.Integer(big=True))
+    started_at = db.Column(db.Datetime)
+
+    score = db.Column(db.Integer, default='0')
+    contributors = db.Column(db.JSON, default="'{}'::jsonb")
+
+    last_active_at = db.Column(db.Datetime)
+    last_counter = db.Column(db.Integer(big=True))
+
+
+class CountStats(db.Table, table_name='count_stats'):
+    guild = db.Column(db.Integer(big=True), primary_key=True)
+    total_counts = db.Column(db.Integer, default=0)
+    total_score = db.Column(db.Integer(big=True), default=0)
+    best_score = db.Column(db.Integer, default=0)
+    best_count = db.Column(db.ForeignKey(table='counts', column='id', sql_type=db.Integer(), on_delete='SET NULL'))
+    last_count = db.Column(db.ForeignKey(table='counts', column='id', sql_type=db.Integer(), on_delete='SET NULL'))
+
+
+class CountStatsCounters(db.Table, table_name='count_stats_counters'):
+    guild = db.Column(db.Integer(big=True), primary_key=True)
+    user_id = db.Column(db.Integer(big=True), primary_key=True)
+    total_score = db.Column(db.Integer, default=0)
+    counts_participated = db.Column(db.Integer, default=0)
+
+    guild_total_score = db.Index('guild', 'total_score DESC')
+
+
+class CountBackfills(db.Table, table_name='count_backfills'):
+    name = db.Column(db.String, primary_key=True)  # The backfill that was done
+    done_at = db.Column(db.Datetime, default="now() at time zone 'utc'")
+
 
 class Counters(db.Table):
     user_id = db.Column(db.Integer(big=True), primary_key=True)
@@ -103,7 +152,14 @@ roman_re = re.compile('^(?=[MDCLXVI])M*(C[MD]|D?C{0,3})(X[CL]|L?X{0,3})(I[XV]|V?
 binary_re = re.compile('^[01]+$')
 hex_re = re.compile('^[\dA-F]+$')
 
+MAX_COUNT_LENGTH = 100  # Longer counts aren't even demojized, no count will ever get this long
+MAX_READINGS = 50  # The maximum amount of readings the parse command lists
+CHECKPOINT_COUNTS = 25  # Running counts are saved to the database after this many counts...
+CHECKPOINT_INTERVAL = 30  # ...or after this many seconds, whichever comes first
+TOP_SCORES = 3  # How many of the highest scores per guild are kept in memory (for the medal reactions)
+
 running_counts = {}
+top_scores = {}  # guild ID -> the TOP_SCORES highest finished scores of that guild, highest first
 # finished_counts = {}
 
 """    Old parsing function
@@ -118,55 +174,83 @@ def parsed(number: str) -> list:
 """
 
 
-def parsed(number: str) -> list:
-    results = ['']
-    numbers = filter(None, emoji.demojize(number).split(':'))
-    for digit in numbers:
-        if digit.isdigit():
-            results = add_parsed(results, [digit])
-        elif digit in number_aliases.keys():
-            results = add_parsed(results, number_aliases[digit])
-        else:
-            return []
-    return results
+def alias_values(piece: str) -> Optional[Sequence[str]]:
+    """Get the numbers a single piece of a demojized count can stand for, or None if it isn't a number."""
+    if piece.isdigit():
+        return piece,
+    return number_aliases.get(piece)
+
+
+def parsed(number: str, limit: int = MAX_READINGS) -> Iterator[str]:
+    """Lazily generate the numbers a count containing number aliases can be read as, at most `limit` of them."""
+    if len(number) > MAX_COUNT_LENGTH:
+        return
+    pieces = []
+    for piece in filter(None, emoji.demojize(number).split(':')):
+        values = alias_values(piece)
+        if values is None:
+            return
+        pieces.append(values)
+    if not pieces:
+        return
+
+    # Only the first piece can make a reading start with a zero, so filtering it here keeps every product valid
+    pieces[0] = [value for value in pieces[0] if value[0] != '0']
+    yield from itertools.islice(map(''.join, itertools.product(*pieces)), limit)
 
 
-def add_parsed(old_results: list, numbers: list) -> list:
-    new_results = []
-    for number in numbers:
-        for result in old_results:
-            s = result + number
-            if len(s) > 0 and s[0] != '0':
-                new_results.append(s)
-    return new_results
+roman_values = (
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'), (50, 'L'), (40, 'XL'),
+    (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')
+)
 
 
 def write_roman(num):
     # from https://stackoverflow.com/questions/28777219/basic-program-to-convert-integer-to-roman-numerals/28777781
-    roman = OrderedDict()
-    roman[1000] = "M"
-    roman[900] = "CM"
-    roman[500] = "D"
-    roman[400] = "CD"
-    roman[100] = "C"
-    roman[90] = "XC"
-    roman[50] = "L"
-    roman[40] = "XL"
-    roman[10] = "X"
-    roman[9] = "IX"
-    roman[5] = "V"
-    roman[4] = "IV"
-    roman[1] = "I"
-
     def roman_num(num):
-        for r in roman.keys():
-            x, y = divmod(num, r)
-            yield roman[r] * x
-            num -= (r * x)
+        for value, numeral in roman_values:
+            x, num = divmod(num, value)
+            yield numeral * x
             if num <= 0:
                 break
 
-    return ''.join([i for i in roman_num(num)])
+    return ''.join(roman_num(num))
+
+
+def spells(count: str, digits: str) -> bool:
+    """Check if a count, possibly containing number aliases, spells out the given digits.
+
+    Instead of building every reading of the aliases, this keeps track of how many of the digits could
+    have been spelled so far, so a single pass over the demojized count is enough.
+    """
+    if len(count) > MAX_COUNT_LENGTH:
+        return False
+    positions = {0}
+    for piece in filter(None, emoji.demojize(count).split(':')):
+        values = alias_values(piece)
+        if values is None:
+            return False
+        positions = {position + len(value) for position in positions for value in values
+                     if digits.startswith(value, position)}
+        if not positions:
+            return False
+    return len(digits) in positions
+
+
+class CountTarget:
+    """All accepted forms of the next number of a count, computed once."""
+    __slots__ = ('number', 'digits', 'forms')
+
+    def __init__(self, number: int):
+        self.number = number
+        self.digits = str(number)
+        self.forms = frozenset((self.digits, write_roman(number), bin(number)[2:], '#' + hex(number)[2:].upper()))
+
+    def matches(self, count: str) -> bool:
+        return count in self.forms or spells(count, self.digits)
+
+    def __repr__(self):
+        return f'<CountTarget number={self.number}>'
 
 
 def from_roman(num):
@@ -187,8 +271,23 @@ async def fetch_counter_record(discord_id, connection) -> asyncpg.Record:
         discord_id)
 
 
+def add_top_score(guild_id: int, score: int):
+    """Insert a finished score into the in-memory leaderboard of a guild."""
+    scores = top_scores.setdefault(guild_id, [])
+    if len(scores) >= TOP_SCORES and score <= scores[-1]:
+        return
+    scores.append(score)
+    scores.sort(reverse=True)
+    del scores[TOP_SCORES:]
+
+
+def contributions(title: str, contributors: dict, names: dict) -> str:
+    """Format the contributors of a count for an embed field, using names from UserNames.resolve."""
+    return '\n'.join([title] + [f'**{names[int(user_id)]}**: {amount}' for user_id, amount in contributors.items()])
+
+
 def is_count_channel(configs, channel: discord.TextChannel) -> bool:
-    return ('count' in channel.name.lower() and not configs[channel.guild.id].count_channels) or channel in configs[channel.guild.id].count_channels
+    return configs[channel.guild.id].is_count_channel(channel)
 
 
 class CounterProfile:
@@ -207,31 +306,11 @@ class CounterProfile:
         self.counts_started = d['counts_started']
 
 
-class Counter:
-    __slots__ = ('original', 'current', 'connection')
-    original: CounterProfile
-    current: CounterProfile
-    connection: asyncpg.pool.Pool
-
-    def __init__(self, record, connection):
-        self.original = CounterProfile(d=db.dict_from_record(record))
-        self.current = CounterProfile(d=db.dict_from_record(record))
-        self.connection = connection
-
-    async def save(self):
-        original_keys = self.original.__dict__.keys()
-        updates = [(key, value) for key, value in self.current.__dict__.items() if
-                   key not in original_keys or value != self.original.__dict__[key]]
-        if updates:
-            query = f'UPDATE counters SET {", ".join([str(key) + " = " + str(value) for key, value in updates])} ' \
-                    f'WHERE user_id={self.original.user_id} RETURNING *;'
-            await self.connection.execute(query)
-
-    async def __aenter__(self) -> CounterProfile:
-        return self.current
-
-    async def __aexit__(self, typ, value, traceback):
-        await self.save()
+class Counter(db.TrackedRecord):
+    __slots__ = ()
+    table = 'counters'
+    key = 'user_id'
+    profile = CounterProfile
 
     def __repr__(self):
         return f'<Counter discord_id={self.current.user_id}>'
@@ -239,7 +318,7 @@ class Counter:
 
 class Counting:
     __slots__ = ('id', 'guild', 'channel', 'started_by', 'started_at', 'score', 'contributors', 'last_active_at',
-                 'last_counter', 'timed_out', 'duration', 'ruined_by', 'mode')
+                 'last_counter', 'timed_out', 'duration', 'ruined_by', 'mode', 'target')
 
     def __init__(self, *, record):
         self.id = record['id']
@@ -254,6 +333,7 @@ class Counting:
         self.timed_out = False
         self.ruined_by = None
         self.mode = 'any'
+        self.target = CountTarget(self.score + 1)
 
     @classmethod
     def temporary(cls, *, guild, channel, started_by, started_at, score=0, contributors=None, last_active_at,
@@ -274,13 +354,11 @@ class Counting:
         return cls(record=pseudo)
 
     def attempt_count(self, counter: discord.User, count: str) -> bool:
-        target = self.score + 1
-        target_s = str(target)
-        if (counter.id != self.last_counter) and (
-                count == target_s or count == write_roman(target) or count == bin(target)[2:] or count == '#' + hex(target)[2:].upper() or target_s in parsed(count)):
+        if counter.id != self.last_counter and self.target.matches(count):
             self.last_active_at = datetime.datetime.utcnow()
             self.last_counter = counter.id
             self.score += 1
+            self.target = CountTarget(self.score + 1)
             if counter.id not in self.contributors.keys():
                 self.contributors[counter.id] = 1
             else:
@@ -307,48 +385,259 @@ class Counting:
                    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7, $8, $9)
                    RETURNING id;
                 """
-        self.id = await connection.fetchval(query, self.guild, self.channel, self.started_by, self.started_at,
-                                            self.score, self.contributors, self.timed_out,
-                                            datetime.datetime.utcnow() - self.started_at, self.ruined_by)
-
-        score_query = 'SELECT score FROM counts where id = $1'
 
-        for discord_id, contribution in self.contributors.items():
-            async with Counter(await fetch_counter_record(discord_id, connection), connection) as counter:
-                # finished_counts[self.channel]['last_counts'][counter.user_id] = counter.last_count
-                # finished_counts[self.channel]['best_counts'][counter.user_id] = counter.best_count
+        # Every contributor is settled in one statement, comparing their best count and best ruin in SQL.
+        # A best count (or ruin) is replaced if it was missing, had a score of 0, or is lower than this count.
+        settle_query = """INSERT INTO counters AS c (user_id, last_count, best_count, best_ruin, total_score,
+                                                     counts_participated, counts_ruined, counts_started)
+                          SELECT contribution.user_id, $3::int, $3::int, CASE WHEN contribution.user_id = $5 THEN $3::int END,
+                                 contribution.amount, 1, (contribution.user_id = $5)::int, (contribution.user_id = $4)::int
+                          FROM unnest($1::bigint[], $2::int[]) AS contribution(user_id, amount)
+                          ON CONFLICT (user_id) DO UPDATE
+                          SET last_count = EXCLUDED.last_count,
+                              total_score = c.total_score + EXCLUDED.total_score,
+                              counts_participated = c.counts_participated + 1,
+                              counts_ruined = c.counts_ruined + EXCLUDED.counts_ruined,
+                              counts_started = c.counts_started + EXCLUDED.counts_started,
+                              best_count = CASE
+                                  WHEN COALESCE((SELECT score FROM counts WHERE id = c.best_count), 0) < GREATEST($6, 1)
+                                  THEN EXCLUDED.best_count ELSE c.best_count END,
+                              best_ruin = CASE
+                                  WHEN EXCLUDED.best_ruin IS NOT NULL
+                                   AND COALESCE((SELECT score FROM counts WHERE id = c.best_ruin), 0) < GREATEST($6, 1)
+                                  THEN EXCLUDED.best_ruin ELSE c.best_ruin END;
+                       """
+
+        contributions_query = """INSERT INTO count_contributions (count_id, user_id, amount)
+                                 SELECT $1, contribution.user_id, contribution.amount
+                                 FROM unnest($2::bigint[], $3::int[]) AS contribution(user_id, amount);
+                              """
+        stats_query = """INSERT INTO count_stats AS s (guild, total_counts, total_score, best_score, best_count, last_count)
+                         VALUES ($1, 1, $2::int, $2::int, $3, $3)
+                         ON CONFLICT (guild) DO UPDATE
+                         SET total_counts = s.total_counts + 1,
+                             total_score = s.total_score + EXCLUDED.total_score,
+                             best_score = GREATEST(s.best_score, EXCLUDED.best_score),
+                             best_count = CASE WHEN EXCLUDED.best_score > s.best_score
+                                               THEN EXCLUDED.best_count ELSE s.best_count END,
+                             last_count = EXCLUDED.last_count;
+                      """
+        stats_counters_query = """INSERT INTO count_stats_counters AS s (guild, user_id, total_score, counts_participated)
+                                  SELECT $1, contribution.user_id, contribution.amount, 1
+                                  FROM unnest($2::bigint[], $3::int[]) AS contribution(user_id, amount)
+                                  ON CONFLICT (guild, user_id) DO UPDATE
+                                  SET total_score = s.total_score + EXCLUDED.total_score,
+                                      counts_participated = s.counts_participated + 1;
+                               """
+
+        user_ids = [int(user_id) for user_id in self.contributors.keys()]
+        amounts = list(self.contributors.values())
+        async with connection.acquire() as con:
+            async with con.transaction():
+                self.id = await con.fetchval(query, self.guild, self.channel, self.started_by, self.started_at,
+                                             self.score, self.contributors, self.timed_out,
+                                             datetime.datetime.utcnow() - self.started_at, self.ruined_by)
+                await con.execute(settle_query, user_ids, amounts, self.id, self.started_by, self.ruined_by,
+                                  self.score)
+                await con.execute(contributions_query, self.id, user_ids, amounts)
+                await con.execute(stats_query, self.guild, self.score, self.id)
+                await con.execute(stats_counters_query, self.guild, user_ids, amounts)
+                await con.execute('DELETE FROM running_counts WHERE channel = $1;', self.channel)
+        add_top_score(self.guild, self.score)
 
-                counter.last_count = self.id
-                counter.total_score += contribution
-                counter.counts_participated += 1
 
-                if counter.best_count is None:
-                    counter.best_count = self.id
-                else:
-                    best_score = await connection.fetchval(score_query, counter.best_count)
-                    if not best_score or best_score < self.score:
-                        counter.best_count = self.id
+class Count(commands.Cog):
+    """Commands for the counting game."""
 
-                if counter.user_id == self.started_by:
-                    counter.counts_started += 1
+    def __init__(self, curator: bot.Curator):
+        self.bot = curator
+        self._dirty = set()  # Channels with a running count that changed since the last checkpoint
+        self._pending = 0  # Counts since the last checkpoint
+        self._checkpoint_due = asyncio.Event(loop=curator.loop)
+        self._checkpoint_lock = asyncio.Lock(loop=curator.loop)
+        self._task = curator.loop.create_task(self.prepare())
+        self._top_scores_task = curator.loop.create_task(self.load_top_scores())
+        self._checkpoint_task = curator.loop.create_task(self.checkpoint_counts())
+
+    def cog_unload(self):
+        self._task.cancel()
+        self._top_scores_task.cancel()
+        self._checkpoint_task.cancel()
+        # Save what is left, the reloaded cog waits for this before picking the counts up again from the database
+        self.bot.count_checkpoint = self.bot.loop.create_task(self.checkpoint())
+
+    def mark_dirty(self, channel_id: int):
+        """Remember that a running count changed, so it gets saved with the next checkpoint."""
+        self._dirty.add(channel_id)
+        self._pending += 1
+        if self._pending >= CHECKPOINT_COUNTS:
+            self._checkpoint_due.set()
+
+    async def checkpoint(self):
+        """Save all running counts that changed since the last checkpoint to the database."""
+        async with self._checkpoint_lock:
+            channels, self._dirty = self._dirty, set()
+            self._pending = 0
+            self._checkpoint_due.clear()
+            counts = [running_counts[channel_id] for channel_id in channels if channel_id in running_counts]
+            if not counts:
+                return
+
+            query = """INSERT INTO running_counts (channel, guild, started_by, started_at, score, contributors,
+                                                   last_active_at, last_counter)
+                       VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7, $8)
+                       ON CONFLICT (channel) DO UPDATE
+                       SET guild = EXCLUDED.guild,
+                           started_by = EXCLUDED.started_by,
+                           started_at = EXCLUDED.started_at,
+                           score = EXCLUDED.score,
+                           contributors = EXCLUDED.contributors,
+                           last_active_at = EXCLUDED.last_active_at,
+                           last_counter = EXCLUDED.last_counter;
+                    """
+            try:
+                await self.bot.pool.executemany(query, [(c.channel, c.guild, c.started_by, c.started_at, c.score,
+                                                         c.contributors, c.last_active_at, c.last_counter)
+                                                        for c in counts])
+            except BaseException:
+                self._dirty |= channels  # Try again with the next checkpoint
+                raise
+
+            # Counts that finished while they were being saved must not be brought back
+            finished = [c.channel for c in counts if running_counts.get(c.channel) is not c]
+            if finished:
+                await self.bot.pool.execute('DELETE FROM running_counts WHERE channel = ANY($1::bigint[]);', finished)
+
+    async def load_running_counts(self):
+        """Restore the counts that were running before the bot or this cog was restarted."""
+        checkpoint = getattr(self.bot, 'count_checkpoint', None)
+        if checkpoint is not None:
+            # The cog was reloaded, the old one has to finish saving its counts first
+            await asyncio.wait([checkpoint])
+        for row in await self.bot.pool.fetch('SELECT * FROM running_counts;'):
+            if row['channel'] in running_counts:
+                continue
+            running_counts[row['channel']] = Counting.temporary(
+                guild=row['guild'], channel=row['channel'], started_by=row['started_by'],
+                started_at=row['started_at'], score=row['score'],
+                contributors={int(user_id): amount for user_id, amount in row['contributors'].items()},
+                last_active_at=row['last_active_at'], last_counter=row['last_counter'])
+
+    async def checkpoint_counts(self):
+        try:
+            await self.bot.wait_until_ready()
+            await self.load_running_counts()
+            while not self.bot.is_closed():
+                try:
+                    await asyncio.wait_for(self._checkpoint_due.wait(), timeout=CHECKPOINT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                await self.checkpoint()
+        except asyncio.CancelledError:
+            raise
+        except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = self.bot.loop.create_task(self.checkpoint_counts())
+
+    async def prepare(self):
+        try:
+            await self.bot.wait_until_ready()
+            await self.upgrade_tables()
+            await self.backfill_count_contributions()
+            await self.backfill_count_stats()
+        except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+            self._task.cancel()
+            self._task = self.bot.loop.create_task(self.prepare())
+
+    async def upgrade_tables(self):
+        """Add the columns and indexes that were added to the count tables, init_db only creates missing tables."""
+        for table in (Counts, CountContributions, RunningCounts, CountStats, CountStatsCounters, CountBackfills,
+                      Counters):
+            await table.upgrade()
+
+        # The statistics of a guild used to be deleted along with its best or last count
+        query = """SELECT con.conname, att.attname
+                   FROM pg_constraint AS con
+                   INNER JOIN pg_attribute AS att ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1]
+                   WHERE con.conrelid = 'count_stats'::regclass AND con.contype = 'f' AND con.confdeltype = 'c';
+                """
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                for row in await con.fetch(query):
+                    await con.execute(f'ALTER TABLE count_stats DROP CONSTRAINT {row["conname"]}, '
+                                      f'ADD CONSTRAINT {row["conname"]} FOREIGN KEY ({row["attname"]}) '
+                                      f'REFERENCES counts (id) ON DELETE SET NULL;')
 
-                if counter.user_id == self.ruined_by:
-                    # finished_counts[self.channel]['ruiner_best'] = counter.best_ruin
+    async def backfill(self, name: str, *queries: str):
+        """Run the queries of a backfill, unless it was done before.
 
-                    counter.counts_ruined += 1
-                    if counter.best_ruin is None:
-                        counter.best_ruin = self.id
-                    else:
-                        best_ruin_score = await connection.fetchval(score_query, counter.best_ruin)
-                        if not best_ruin_score or best_ruin_score < self.score:
-                            counter.best_ruin = self.id
+        It is marked as done in the same transaction, so it is done exactly once even if the bot stops halfway.
+        """
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                query = 'INSERT INTO count_backfills (name) VALUES ($1) ON CONFLICT (name) DO NOTHING RETURNING name;'
+                if await con.fetchval(query, name) is None:
+                    return
+                for query in queries:
+                    await con.execute(query)
+
+    async def backfill_count_contributions(self):
+        """Move the contributors of counts from before count_contributions existed into it."""
+        query = """INSERT INTO count_contributions (count_id, user_id, amount)
+                   SELECT id, contribution.key::bigint, contribution.value::int
+                   FROM counts, jsonb_each_text(contributors) AS contribution
+                   ON CONFLICT (count_id, user_id) DO NOTHING;
+                """
+        await self.backfill('count_contributions', query)
 
+    async def backfill_count_stats(self):
+        """Fill the count statistics from all counts so far.
 
-class Count(commands.Cog):
-    """Commands for the counting game."""
+        Statistics that counts finished since the start already made are replaced, those counts are included.
+        """
+        stats_query = """INSERT INTO count_stats (guild, total_counts, total_score, best_score, best_count, last_count)
+                         SELECT guild, count(*), sum(score), max(score),
+                                (array_agg(id ORDER BY score DESC, id))[1],
+                                (array_agg(id ORDER BY started_at + duration DESC NULLS LAST))[1]
+                         FROM counts
+                         GROUP BY guild
+                         ON CONFLICT (guild) DO UPDATE
+                         SET total_counts = EXCLUDED.total_counts,
+                             total_score = EXCLUDED.total_score,
+                             best_score = EXCLUDED.best_score,
+                             best_count = EXCLUDED.best_count,
+                             last_count = EXCLUDED.last_count;
+                      """
+        stats_counters_query = """INSERT INTO count_stats_counters (guild, user_id, total_score, counts_participated)
+                                  SELECT counts.guild, contribution.user_id, sum(contribution.amount), count(*)
+                                  FROM count_contributions AS contribution
+                                  INNER JOIN counts ON counts.id = contribution.count_id
+                                  GROUP BY counts.guild, contribution.user_id
+                                  ON CONFLICT (guild, user_id) DO UPDATE
+                                  SET total_score = EXCLUDED.total_score,
+                                      counts_participated = EXCLUDED.counts_participated;
+                               """
+        await self.backfill('count_stats', stats_query, stats_counters_query)
+
+    async def load_top_scores(self):
+        """Load the highest scores of every guild into memory, so counting doesn't need the database."""
+        query = """SELECT guild, score
+                   FROM (SELECT guild, score, row_number() OVER (PARTITION BY guild ORDER BY score DESC) AS rank
+                         FROM counts) AS ranked
+                   WHERE rank <= $1
+                   ORDER BY guild, score DESC;
+                """
+        try:
+            await self.bot.wait_until_ready()
+            rows = await self.bot.pool.fetch(query, TOP_SCORES)
+        except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+            self._top_scores_task.cancel()
+            self._top_scores_task = self.bot.loop.create_task(self.load_top_scores())
+            return
 
-    def __init__(self, curator: bot.Curator):
-        self.bot = curator
+        top_scores.clear()
+        for row in rows:
+            top_scores.setdefault(row['guild'], []).append(row['score'])
 
     async def check_count(self, message: discord.Message) -> bool:
         if is_count_channel(self.bot.server_configs, message.channel):
@@ -369,17 +658,17 @@ class Count(commands.Cog):
             del (running_counts[message.channel.id])
             await message.channel.send(f'{message.author.mention} failed, and ruined the count for '
                                        f'{len(c.contributors.keys())} counters...\nThe count reached {c.score}.')
-            await c.finish(self.bot, False, message.author)
+            async with self._checkpoint_lock:  # So a checkpoint that is being saved can't bring the count back
+                await c.finish(self.bot, False, message.author)
 
             return False
 
+        self.mark_dirty(message.channel.id)
         if '69' in str(c.score):
             await message.add_reaction('👌🏻')
         if c.score % 100 == 0:
             await message.add_reaction('💯')
-        query = 'SELECT score FROM counts WHERE guild = $1 ORDER BY score DESC LIMIT 3;'
-        top = [count['score'] for count in await self.bot.pool.fetch(query, message.guild.id)]
-        for i, v in enumerate(top):
+        for i, v in enumerate(top_scores.get(message.guild.id, ())):
             if c.score == v + 1:
                 await message.add_reaction(('\U0001F947', '\U0001F948', '\U0001F949')[i])
                 break
@@ -395,12 +684,12 @@ class Count(commands.Cog):
     async def start(self, ctx: commands.Context):
         """Use this to start a counting game!"""
         if is_count_channel(self.bot.server_configs, ctx.channel):
-            query = 'SELECT score FROM counts WHERE guild = $1 ORDER BY score DESC LIMIT 3;'
-            top = [count['score'] for count in await self.bot.pool.fetch(query, ctx.guild.id)]
+            top = top_scores.get(ctx.guild.id, [])
             running_counts[ctx.channel.id] = Counting.temporary(guild=ctx.guild.id, channel=ctx.channel.id,
                                                                 started_by=ctx.author.id,
                                                                 started_at=datetime.datetime.utcnow(),
                                                                 last_active_at=datetime.datetime.utcnow())
+            self.mark_dirty(ctx.channel.id)
             await ctx.send(f'Count has been started. Try for top three: '
                            f'{human_join([str(i) for i in top]) if top and len(top) == 3 else "good luck"}!')
         else:
@@ -429,7 +718,7 @@ class Count(commands.Cog):
 
         query = 'UPDATE serverconfigs SET count_channels = array_append(count_channels, $1) WHERE guild = $2;'
         await self.bot.pool.fetchval(query, channel.id, ctx.guild.id)
-        self.bot.server_configs[ctx.guild.id].count_channels.append(channel)
+        self.bot.server_configs[ctx.guild.id].add_count_channel(channel)
         await ctx.send(f'Successfully added {channel.mention}.')
 
     @channels.command(name='remove', aliases=['delete'])
@@ -439,6 +728,13 @@ class Count(commands.Cog):
         Provide a channel mention, ID or name.
         If there are no counting channels left, every channel with "count" in the name will be available.
         """
+        if channel not in self.bot.server_configs[ctx.guild.id].count_channels:
+            return await ctx.send('This channel is not on the list.')
+
+        query = 'UPDATE serverconfigs SET count_channels = array_remove(count_channels, $1) WHERE guild = $2;'
+        await self.bot.pool.fetchval(query, channel.id, ctx.guild.id)
+        self.bot.server_configs[ctx.guild.id].remove_count_channel(channel)
+        await ctx.send(f'Successfully removed {channel.mention}.')
 
     @count.command()
     async def profile(self, ctx: commands.Context, *, user: Optional[discord.User]):
@@ -487,27 +783,21 @@ class Count(commands.Cog):
         """Get the data of the top 5 highest counts."""
         async with ctx.typing():
             embed = discord.Embed(title='Count Leaderboard', description='Top 5 Highest Counts :slight_smile:')
-            query = 'SELECT score, contributors FROM counts WHERE guild = $1 ORDER BY score DESC LIMIT 5;'
+            query = """SELECT top.id, top.score, contribution.user_id, contribution.amount
+                       FROM (SELECT id, score FROM counts WHERE guild = $1 ORDER BY score DESC LIMIT 5) AS top
+                       LEFT JOIN count_contributions AS contribution ON contribution.count_id = top.id
+                       ORDER BY top.score DESC, top.id, contribution.amount DESC;
+                    """
             rows = await self.bot.pool.fetch(query, ctx.guild.id)
-            users = {
-            }
-            i = 0
+            counts = {}  # count ID -> (score, {user ID: amount}), in leaderboard order
             for row in rows:
-                i += 1
-                contributors = row['contributors']
-                keys = contributors.keys()
-                a = [f'**Score: {row["score"]}**']
-                for user_id in keys:
-                    if user_id in users.keys():
-                        name = users[user_id]
-                    else:
-                        user = await self.bot.fetch_user(user_id)
-                        name = user.name
-                        users[user_id] = name
-
-                    a.append(f'**{name}**: {contributors[user_id]}')
-
-                embed.add_field(name=str(i), value='\n'.join(a), inline=False)
+                score, contributors = counts.setdefault(row['id'], (row['score'], {}))
+                if row['user_id'] is not None:
+                    contributors[row['user_id']] = row['amount']
+            names = await self.bot.user_names.resolve(row['user_id'] for row in rows if row['user_id'] is not None)
+            for i, (score, contributors) in enumerate(counts.values(), 1):
+                embed.add_field(name=str(i), value=contributions(f'**Score: {score}**', contributors, names),
+                                inline=False)
 
             await ctx.send(embed=embed)
 
@@ -516,59 +806,54 @@ class Count(commands.Cog):
         """Get the data of the last count."""
         async with ctx.typing():
             embed = discord.Embed(title='Last Count', description='Last count data')
-            query = 'SELECT score, contributors FROM counts WHERE guild = $1 ORDER BY started_at + duration DESC;'
+            query = 'SELECT score, contributors FROM counts WHERE guild = $1 ORDER BY started_at + duration DESC LIMIT 1;'
             row = await self.bot.pool.fetchrow(query, ctx.guild.id)
-            users = {
-            }
-            contributors = row[1]
-            keys = contributors.keys()
-            a = [f'**Score: {row[0]}**']
-            for user_id in keys:
-                if user_id in users.keys():
-                    name = users[user_id]
-                else:
-                    user = await self.bot.fetch_user(user_id)
-                    name = user.name
-                    users[user_id] = name
-
-                a.append(f'**{name}**: {contributors[user_id]}')
-
-            embed.add_field(name='Last', value='\n'.join(a), inline=False)
+            names = await self.bot.user_names.resolve(row[1])
+            embed.add_field(name='Last', value=contributions(f'**Score: {row[0]}**', row[1], names), inline=False)
 
             await ctx.send(embed=embed)
 
+    @count.command(aliases=['statistics'])
+    async def stats(self, ctx: commands.Context):
+        """Get the statistics of all the counts on this server."""
+        stats = await self.bot.pool.fetchrow('SELECT * FROM count_stats WHERE guild = $1;', ctx.guild.id)
+        if not stats:
+            return await ctx.send('No counts have been played on this server yet.')
+
+        query = """SELECT user_id, total_score
+                   FROM count_stats_counters
+                   WHERE guild = $1
+                   ORDER BY total_score DESC
+                   LIMIT 5;
+                """
+        top = await self.bot.pool.fetch(query, ctx.guild.id)
+        names = await self.bot.user_names.resolve(row['user_id'] for row in top)
+
+        embed = discord.Embed(title='Count Statistics')
+        embed.add_field(name='Total Counts', value=f'{stats["total_counts"]} rounds')
+        embed.add_field(name='Best Round', value=f'{stats["best_score"]} (round {stats["best_count"]})')
+        embed.add_field(name='Average Score', value=f'{stats["total_score"] / stats["total_counts"]:.1f}')
+        if top:
+            embed.add_field(name='Top Counters', inline=False,
+                            value='\n'.join(f'**{names[row["user_id"]]}**: {row["total_score"]}' for row in top))
+        await ctx.send(embed=embed)
+
     @count.command(aliases=['current', 'active', 'atm'])
     async def running(self, ctx: commands.Context):
         """Get the data of all the currently running counts."""
         async with ctx.typing():
             embed = discord.Embed(title='Currently Running Counts',
                                   description='Data of the counts that are still running')
-            guild_channels = ctx.guild.text_channels
-            running_channels = []
-            for guild_channel in guild_channels:
-                if guild_channel.id in running_counts.keys():
-                    running_channels.append(self.bot.get_channel(guild_channel.id))
+            running_channels = [channel for channel in ctx.guild.text_channels if channel.id in running_counts]
             if len(running_channels) == 0:
                 return await ctx.send('There are no counts running on this server.')
+            names = await self.bot.user_names.resolve(user_id for channel in running_channels
+                                                      for user_id in running_counts[channel.id].contributors)
             for channel in running_channels:
                 c: Counting = running_counts[channel.id]
-
-                users = {
-                }
-                contributors = c.contributors
-                keys = contributors.keys()
-                a = [f'**Score thus far: {c.score}**']
-                for user_id in keys:
-                    if user_id in users.keys():
-                        name = users[user_id]
-                    else:
-                        user = await self.bot.fetch_user(user_id)
-                        name = user.name
-                        users[user_id] = name
-
-                    a.append(f'**{name}**: {contributors[user_id]}')
-
-                embed.add_field(name=f'Count in {channel.name}', value='\n'.join(a), inline=False)
+                embed.add_field(name=f'Count in {channel.name}',
+                                value=contributions(f'**Score thus far: {c.score}**', c.contributors, names),
+                                inline=False)
 
             await ctx.send(embed=embed)
 
@@ -581,7 +866,8 @@ class Count(commands.Cog):
                 return await ctx.send(hex_result)
             else:
                 return await ctx.send('Could not parse that.')
-        parse = parsed(number)
+        parse = list(parsed(number))
+        truncated = len(parse) >= MAX_READINGS
         roman = from_roman(number) if roman_re.fullmatch(number) else None
         binary = int(number, 2) if binary_re.fullmatch(number) else None
 
@@ -595,7 +881,8 @@ class Count(commands.Cog):
         #     parse.append(hex_result)
 
         if parse:
-            await ctx.send(human_join([str(i) for i in sorted([int(i) for i in parse])]))
+            await ctx.send(human_join([str(i) for i in sorted({int(i) for i in parse})]) +
+                           (' (and possibly more)' if truncated else ''))
         else:
             await ctx.send('Could not parse that.')
 
@@ -614,14 +901,3 @@ class Count(commands.Cog):
 
 def setup(curator: bot.Curator):
     curator.add_cog(Count(curator))
-
-
-"""def teardown(curator: bot.Curator):
-    \"""Code being executed upon unloading of the cog.\"""
-    for channel_id in running_counts.keys():  # Let counters know the count is silently dying
-        counters = len(running_counts[channel_id]['contributors'])
-        s = 's' if counters > 1 else ''
-        await curator.get_channel(channel_id).send(
-            f'Sorry, {f"counter{s}, " if counters >= 1 else ""}due to this module being un-/reloaded, the count that '
-            f'was running here is now down. No data of it has been saved to the database of counts or '
-            f'{f"your counter profile{s}" if counters >= 1 else "the counter profile of the starter"}.')"""
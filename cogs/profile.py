@@ -1,6 +1,5 @@
 import datetime
 from typing import Optional
-from uuid import UUID
 
 import asyncpg
 import discord
@@ -24,32 +23,11 @@ class UserProfile:
         self.minecraft_uuid = d['minecraft_uuid']
 
 
-class UserConnection:
-    __slots__ = ('original', 'current', 'connection')
-    original: UserProfile
-    current: UserProfile
-    connection: asyncpg.pool.Pool
-
-    def __init__(self, record, connection):
-        self.original = UserProfile(d=db.dict_from_record(record))
-        self.current = UserProfile(d=db.dict_from_record(record))
-        self.connection = connection
-
-    async def save(self):
-        original_keys = self.original.__dict__.keys()
-        updates = [(key, value) for key, value in self.current.__dict__.items() if
-                   key not in original_keys or value != self.original.__dict__[key]]
-        if updates:
-            updatestr = ", ".join([str(key) + " = " + (str(value) if type(value) is not UUID else f"'{value.hex}'") for key, value in updates])
-            query = f'UPDATE profiles SET {updatestr} WHERE discord_id={self.original.discord_id} RETURNING *;'
-            print(query)
-            await self.connection.execute(query)
-
-    async def __aenter__(self) -> UserProfile:
-        return self.current
-
-    async def __aexit__(self, typ, value, traceback):
-        await self.save()
+class UserConnection(db.TrackedRecord):
+    __slots__ = ()
+    table = 'profiles'
+    key = 'discord_id'
+    profile = UserProfile
 
     def __repr__(self):
         return f'<User id={self.current.id}, discord_id={self.current.discord_id}, minecraft_uuid={self.current.minecraft_uuid}>'
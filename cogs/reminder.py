@@ -1,4 +1,5 @@
-import copy
+import heapq
+from collections import OrderedDict
 
 from .utils import checks, db, time, formats
 from discord.ext import commands
@@ -9,6 +10,27 @@ import datetime
 import textwrap
 
 
+TIMER_WINDOW = datetime.timedelta(days=1)  # How far ahead timers are loaded into memory
+TIMER_PAGE_SIZE = 500  # How many timers are loaded per query
+TIMER_SHARDS = 16  # Timers are split by id between the processes sharing the reminders table
+TIMER_LOCK = 1717  # First key of the advisory locks, the second is the shard (or TIMER_SHARDS for membership)
+TIMER_REBALANCE = datetime.timedelta(seconds=30)  # How often the shards are shared out again
+DELIVERY_DELAY = 1  # Seconds a reminder waits for others due in the same channel, to be sent together
+CHANNEL_CACHE_SIZE = 1024  # How many channels that aren't in the gateway cache are remembered
+
+
+def next_occurrence(expires, repeat, now):
+    """The first time a timer that started at expires and repeats every repeat fires after now."""
+    if expires > now:
+        return expires
+    return expires + repeat * ((now - expires) // repeat + 1)
+
+
+def next_reset(now):
+    """The next midnight UTC, when IdleRPG's daily commands reset."""
+    return datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+
+
 class Reminders(db.Table):
     id = db.PrimaryKeyColumn()
 
@@ -16,10 +38,15 @@ class Reminders(db.Table):
     created = db.Column(db.Datetime, default="now() at time zone 'utc'")
     event = db.Column(db.String)
     extra = db.Column(db.JSON, default="'{}'::jsonb")
+    author_id = db.Column(db.Integer(big=True))  # Who the timer belongs to, if anyone
+    channel_id = db.Column(db.Integer(big=True))
+    repeat = db.Column(db.Interval)  # Recurring timers keep firing this often, counting from expires
+
+    author_expires = db.Index('author_id', 'expires')
 
 
 class Timer:
-    __slots__ = ('args', 'kwargs', 'event', 'id', 'created_at', 'expires')
+    __slots__ = ('args', 'kwargs', 'event', 'id', 'created_at', 'expires', 'author_id', 'channel_id', 'repeat')
 
     def __init__(self, *, record):
         self.id = record['id']
@@ -30,18 +57,38 @@ class Timer:
         self.event = record['event']
         self.created_at = record['created']
         self.expires = record['expires']
+        self.author_id = record.get('author_id')
+        self.channel_id = record.get('channel_id')
+        self.repeat = record.get('repeat')
 
     @classmethod
-    def temporary(cls, *, expires, created, event, args, kwargs):
+    def temporary(cls, *, expires, created, event, args, kwargs, author_id=None, channel_id=None, repeat=None):
         pseudo = {
             'id': None,
             'extra': {'args': args, 'kwargs': kwargs},
             'event': event,
             'created': created,
-            'expires': expires
+            'expires': expires,
+            'author_id': author_id,
+            'channel_id': channel_id,
+            'repeat': repeat
         }
         return cls(record=pseudo)
 
+    def recur(self, now):
+        """Returns the occurrence of this recurring timer that fires after now."""
+        record = {
+            'id': self.id,
+            'extra': {'args': self.args, 'kwargs': self.kwargs},
+            'event': self.event,
+            'created': self.created_at,
+            'expires': next_occurrence(self.expires, self.repeat, now),
+            'author_id': self.author_id,
+            'channel_id': self.channel_id,
+            'repeat': self.repeat
+        }
+        return Timer(record=record)
+
     def __eq__(self, other):
         try:
             return self.id == other.id
@@ -53,6 +100,9 @@ class Timer:
 
     @property
     def human_delta(self):
+        if self.repeat is not None:
+            # since the previous occurrence
+            return time.human_timedelta(max(self.created_at, self.expires - self.repeat))
         return time.human_timedelta(self.created_at)
 
     def __repr__(self):
@@ -64,69 +114,350 @@ class Reminder(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self._have_data = asyncio.Event(loop=bot.loop)
-        self._current_timer = None
+        self._have_data = asyncio.Event(loop=bot.loop)  # Set when a timer is scheduled, to wake up the dispatcher
+        self._upgraded = asyncio.Event(loop=bot.loop)  # Set once the reminders table has all its columns
+        self._heap = []  # (expires, id) of the scheduled timers, the earliest first
+        self._timers = {}  # id -> Timer, every timer of our shards expiring before self._loaded_until or recurring
+        self._loaded_until = None
+        self._shards = set()  # The shards this process holds the advisory lock of, and so dispatches
+        self._lock_connection = None  # The connection holding the advisory locks
+        self._rebalance_at = None
+        self._deliveries = {}  # channel ID -> reminders waiting to be sent there
+        self._channels = OrderedDict()  # channel ID -> fetched channel, or None if we can't get it
         self._task = bot.loop.create_task(self.dispatch_timers())
 
     def cog_unload(self):
         self._task.cancel()
+        self.bot.loop.create_task(self.release_shards())
+
+    async def cog_before_invoke(self, ctx):
+        await self._upgraded.wait()
 
     async def cog_command_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
             await ctx.send(error)
 
-    async def get_active_timer(self, *, connection=None, days=7):
-        query = "SELECT * FROM reminders WHERE expires < (CURRENT_DATE + $1::interval) ORDER BY expires LIMIT 1;"
+    def schedule(self, timer):
+        self._timers[timer.id] = timer
+        heapq.heappush(self._heap, (timer.expires, timer.id))
+
+    def unschedule(self, timer_id):
+        # The heap entry stays, it is skipped once it comes up
+        self._timers.pop(timer_id, None)
+
+    async def claim_shards(self):
+        """Share the shards out between the processes using the reminders table.
+
+        Every process holds a shared advisory lock to be counted, and an exclusive one for each shard it
+        dispatches. Processes give up the shards they have over their fair share and take up free ones
+        until they have it. Locks held by a process that dies are freed with its connection.
+        """
+        con = self._lock_connection
+        if con is None:
+            con = self._lock_connection = await self.bot.pool.acquire()
+            await con.fetchval('SELECT pg_try_advisory_lock_shared($1, $2);', TIMER_LOCK, TIMER_SHARDS)
+            await con.add_listener('reminders', self.on_timer_notification)
+
+        query = """SELECT objid::bigint
+                   FROM pg_locks
+                   WHERE locktype = 'advisory'
+                   AND classid::bigint = $1
+                   AND objid::bigint < $2
+                   AND objsubid = 2
+                   AND pid = pg_backend_pid()
+                   AND granted;
+                """
+        held = {record[0] for record in await con.fetch(query, TIMER_LOCK, TIMER_SHARDS)}
+        self.drop_shards(self._shards - held)
+
+        query = """SELECT count(*)
+                   FROM pg_locks
+                   WHERE locktype = 'advisory'
+                   AND classid::bigint = $1
+                   AND objid::bigint = $2
+                   AND objsubid = 2
+                   AND granted;
+                """
+        members = await con.fetchval(query, TIMER_LOCK, TIMER_SHARDS)
+        share = -(-TIMER_SHARDS // max(members, 1))
+
+        for shard in sorted(held, reverse=True)[:max(len(held) - share, 0)]:
+            # forget the timers before unlocking, so they are never dispatched twice
+            self.drop_shards({shard})
+            await con.fetchval('SELECT pg_advisory_unlock($1, $2);', TIMER_LOCK, shard)
+
+        claimed = set()
+        for shard in range(TIMER_SHARDS):
+            if len(self._shards) + len(claimed) >= share:
+                break
+            if shard not in self._shards and await con.fetchval('SELECT pg_try_advisory_lock($1, $2);',
+                                                                TIMER_LOCK, shard):
+                claimed.add(shard)
+
+        if claimed:
+            self._shards |= claimed
+            await self.load_recurring_timers(claimed)
+            if self._loaded_until is not None:
+                await self.load_timers(claimed, self._loaded_until)
+
+    def drop_shards(self, shards):
+        if not shards:
+            return
+        self._shards -= shards
+        for timer_id in [timer_id for timer_id in self._timers if timer_id % TIMER_SHARDS in shards]:
+            del self._timers[timer_id]
+
+    async def release_shards(self):
+        """Stop dispatching any shard, the advisory locks are released with the connection."""
+        self.drop_shards(set(self._shards))
+        con, self._lock_connection = self._lock_connection, None
+        if con is not None:
+            await self.bot.pool.release(con)
+
+    def on_timer_notification(self, connection, pid, channel, payload):
+        self.bot.loop.create_task(self.load_timer(int(payload)))
+
+    async def announce_timers(self, timers, *, connection=None):
+        # let the processes dispatching the timers know about them, unless they would find them on their own
+        now = datetime.datetime.utcnow()
+        ids = [timer.id for timer in timers
+               if timer.id % TIMER_SHARDS not in self._shards
+               and (timer.repeat is not None or timer.expires < now + TIMER_WINDOW)]
+        if ids:
+            con = connection or self.bot.pool
+            await con.execute("SELECT pg_notify('reminders', id::text) FROM unnest($1::int[]) AS id;", ids)
+
+    async def load_timer(self, timer_id):
+        if timer_id % TIMER_SHARDS not in self._shards or timer_id in self._timers:
+            return
+
+        record = await self.bot.pool.fetchrow('SELECT * FROM reminders WHERE id = $1;', timer_id)
+        if record is None or timer_id % TIMER_SHARDS not in self._shards or timer_id in self._timers:
+            return
+
+        timer = Timer(record=record)
+        if timer.repeat is not None:
+            self.schedule(timer.recur(datetime.datetime.utcnow()))
+        elif self._loaded_until is not None and timer.expires < self._loaded_until:
+            self.schedule(timer)
+        else:
+            return
+        self._have_data.set()
+
+    async def load_recurring_timers(self, shards, *, connection=None):
+        """Schedule the next occurrence of every recurring timer of the shards, they are kept in memory for good."""
+        query = "SELECT * FROM reminders WHERE repeat IS NOT NULL AND id % $1 = ANY($2::int[]);"
         con = connection or self.bot.pool
+        now = datetime.datetime.utcnow()
+        for record in await con.fetch(query, TIMER_SHARDS, list(shards)):
+            if record['id'] not in self._timers:
+                self.schedule(Timer(record=record).recur(now))
+
+    async def load_timers(self, shards, until, *, after=None, connection=None):
+        """Schedule the timers of the shards expiring before until (and after after), a page at a time."""
+        if not shards:
+            return
 
-        record = await con.fetchrow(query, datetime.timedelta(days=days))
-        return Timer(record=record) if record else None
+        query = """SELECT * FROM reminders
+                   WHERE expires < $1
+                   AND (expires, id) > ($2, $3)
+                   AND repeat IS NULL
+                   AND id % $5 = ANY($6::int[])
+                   ORDER BY expires, id
+                   LIMIT $4;
+                """
+        con = connection or self.bot.pool
+        last_expires, last_id = after or datetime.datetime.min, 0
+        while True:
+            records = await con.fetch(query, until, last_expires, last_id, TIMER_PAGE_SIZE, TIMER_SHARDS, list(shards))
+            for record in records:
+                if record['id'] not in self._timers:
+                    self.schedule(Timer(record=record))
+            if len(records) < TIMER_PAGE_SIZE:
+                break
+            last_expires, last_id = records[-1]['expires'], records[-1]['id']
+
+    async def advance_window(self):
+        """Schedule the timers expiring before the end of the next window."""
+        previous = self._loaded_until
+        # Timers created from now on that expire before the end of the window are scheduled by create_timer
+        self._loaded_until = datetime.datetime.utcnow() + TIMER_WINDOW
+        try:
+            await self.load_timers(self._shards, self._loaded_until, after=previous)
+        except BaseException:
+            self._loaded_until = previous
+            raise
 
-    async def wait_for_active_timers(self, *, connection=None, days=7):
-        async with db.MaybeAcquire(connection=connection, pool=self.bot.pool) as con:
-            timer = await self.get_active_timer(connection=con, days=days)
-            if timer is not None:
-                self._have_data.set()
-                return timer
+    def pop_due_timers(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            expires, timer_id = heapq.heappop(self._heap)
+            timer = self._timers.get(timer_id)
+            if timer is not None and timer.expires == expires:
+                del self._timers[timer_id]
+                due.append(timer)
+        return due
+
+    async def call_timers(self, timers):
+        # recurring timers stay in the database, moved on to their next occurrence, which gets scheduled
+        once = []
+        recurring = []
+        now = datetime.datetime.utcnow()
+        for timer in timers:
+            if timer.repeat is None:
+                once.append(timer)
+            else:
+                following = timer.recur(now)
+                recurring.append((timer, following))
+                self.schedule(following)
+
+        if recurring:
+            await self.claim_recurring_timers(recurring)
+        if not once:
+            return
 
-            self._have_data.clear()
-            self._current_timer = None
-            await self._have_data.wait()
-            return await self.get_active_timer(connection=con, days=days)
+        # delete the timers, only the ones that were still there get dispatched
+        query = "DELETE FROM reminders WHERE id = ANY($1::int[]) RETURNING id;"
+        try:
+            records = await self.bot.pool.fetch(query, [timer.id for timer in once])
+        except BaseException:
+            for timer in once:
+                self.schedule(timer)
+            raise
 
-    async def call_timer(self, timer):
-        # delete the timer
-        query = "DELETE FROM reminders WHERE id=$1;"
-        await self.bot.pool.execute(query, timer.id)
+        deleted = {record['id'] for record in records}
+        for timer in once:
+            if timer.id in deleted:
+                self.bot.dispatch(f'{timer.event}_timer_complete', timer)
 
-        # dispatch the event
-        event_name = f'{timer.event}_timer_complete'
-        self.bot.dispatch(event_name, timer)
+    async def claim_recurring_timers(self, timers):
+        """Move the recurring timers on to the occurrence after, only the process that does so dispatches them.
+
+        timers is a list of (due timer, its next occurrence).
+        """
+        query = """UPDATE reminders AS r
+                   SET expires = t.next
+                   FROM unnest($1::int[], $2::timestamp[], $3::timestamp[]) AS t(id, expires, next)
+                   WHERE r.id = t.id
+                   AND r.expires <= t.expires
+                   RETURNING r.id;
+                """
+        try:
+            records = await self.bot.pool.fetch(query,
+                                                [timer.id for timer, _ in timers],
+                                                [timer.expires for timer, _ in timers],
+                                                [following.expires for _, following in timers])
+        except BaseException:
+            for timer, _ in timers:
+                self.schedule(timer)
+            raise
+
+        claimed = {record['id'] for record in records}
+        missed = [timer.id for timer, _ in timers if timer.id not in claimed]
+        if missed:
+            # they might have been deleted by another process rather than fired
+            query = "SELECT id FROM reminders WHERE id = ANY($1::int[]);"
+            found = {record['id'] for record in await self.bot.pool.fetch(query, missed)}
+            for timer_id in missed:
+                if timer_id not in found:
+                    self.unschedule(timer_id)
+
+        for timer, _ in timers:
+            if timer.id in claimed:
+                self.bot.dispatch(f'{timer.event}_timer_complete', timer)
+
+    async def upgrade_table(self):
+        """Add the columns and indexes made after the reminders table was created, then fill in the owners."""
+        await Reminders.upgrade()
+        self._upgraded.set()
+        await self.backfill_owners()
+
+    async def backfill_owners(self):
+        """Fill in the owner of reminders from before they had their own columns."""
+        query = """UPDATE reminders
+                   SET author_id = (extra #>> '{args,0}')::bigint,
+                       channel_id = (extra #>> '{args,1}')::bigint
+                   WHERE event = 'reminder'
+                   AND author_id IS NULL;
+                """
+        await self.bot.pool.execute(query)
 
     async def dispatch_timers(self):
         try:
+            if self._loaded_until is None:
+                await self.upgrade_table()
+
             while not self.bot.is_closed():
-                # can only asyncio.sleep for up to ~48 days reliably
-                # so we're gonna cap it off at 40 days
-                # see: http://bugs.python.org/issue20493
-                timer = self._current_timer = await self.wait_for_active_timers(days=40)
                 now = datetime.datetime.utcnow()
-
-                if timer.expires >= now:
-                    to_sleep = (timer.expires - now).total_seconds()
-                    await asyncio.sleep(to_sleep)
-
-                await self.call_timer(timer)
+                if self._rebalance_at is None or now >= self._rebalance_at:
+                    await self.claim_shards()
+                    self._rebalance_at = now + TIMER_REBALANCE
+
+                if self._loaded_until is None or now >= self._loaded_until:
+                    await self.advance_window()
+
+                due = self.pop_due_timers(now)
+                if due:
+                    await self.call_timers(due)
+                    continue
+
+                wake_at = min(self._loaded_until, self._rebalance_at)
+                if self._heap:
+                    wake_at = min(self._heap[0][0], wake_at)
+                self._have_data.clear()
+                try:
+                    await asyncio.wait_for(self._have_data.wait(), timeout=(wake_at - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
         except asyncio.CancelledError:
             raise
         except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+            # the advisory locks might have gone with the connection, start over
+            await self.release_shards()
+            self._loaded_until = None
+            self._rebalance_at = None
             self._task.cancel()
             self._task = self.bot.loop.create_task(self.dispatch_timers())
 
+    async def save_timers(self, timers, *, connection=None):
+        query = """INSERT INTO reminders (event, extra, expires, created, author_id, channel_id, repeat)
+                   SELECT t.event, t.extra, t.expires, t.created, t.author_id, t.channel_id, t.repeat
+                   FROM unnest($1::text[], $2::jsonb[], $3::timestamp[], $4::timestamp[],
+                               $5::bigint[], $6::bigint[], $7::interval[])
+                        WITH ORDINALITY AS t(event, extra, expires, created, author_id, channel_id, repeat, n)
+                   ORDER BY t.n
+                   RETURNING id;
+                """
+        con = connection or self.bot.pool
+        records = await con.fetch(query,
+                                  [timer.event for timer in timers],
+                                  [{'args': timer.args, 'kwargs': timer.kwargs} for timer in timers],
+                                  [timer.expires for timer in timers],
+                                  [timer.created_at for timer in timers],
+                                  [timer.author_id for timer in timers],
+                                  [timer.channel_id for timer in timers],
+                                  [timer.repeat for timer in timers])
+        for timer, record in zip(timers, records):
+            timer.id = record['id']
+
+        await self.announce_timers(timers, connection=connection)
+
     async def short_timer_optimisation(self, seconds, timer):
+        # the timer is saved in the background, so it can still be listed, cancelled and restored after a restart
+        save = self.bot.loop.create_task(self.save_timers([timer]))
         await asyncio.sleep(seconds)
-        event_name = f'{timer.event}_timer_complete'
-        self.bot.dispatch(event_name, timer)
+        try:
+            await save
+        except Exception:
+            pass
+
+        if timer.id is None:
+            # it wasn't saved, so it can't have been fired or cancelled elsewhere either
+            self.bot.dispatch(f'{timer.event}_timer_complete', timer)
+            return
+
+        # if its dispatcher loaded it as well, only one of us gets to delete (and so fire) it
+        await self.call_timers([timer])
 
     async def create_timer(self, *args, **kwargs):
         """Creates a timer.
@@ -145,6 +476,16 @@ class Reminder(commands.Cog):
         connection: asyncpg.Connection
             Special keyword-only argument to use a specific connection
             for the DB request.
+        author_id: int
+            Special keyword-only argument for the ID of the user the timer
+            belongs to, so their timers can be looked up quickly.
+        channel_id: int
+            Special keyword-only argument for the ID of the channel the timer
+            belongs to.
+        repeat: datetime.timedelta
+            Special keyword-only argument to make the timer recurring. It is
+            stored once and fires every ``repeat`` from ``when`` onwards, until
+            it is deleted.
         created: datetime.datetime
             Special keyword-only argument to use as the creation time.
             Should make the timedeltas a bit more consistent.
@@ -169,59 +510,107 @@ class Reminder(commands.Cog):
         except KeyError:
             now = datetime.datetime.utcnow()
 
-        timer = Timer.temporary(event=event, args=args, kwargs=kwargs, expires=when, created=now)
+        author_id = kwargs.pop('author_id', None)
+        channel_id = kwargs.pop('channel_id', None)
+        repeat = kwargs.pop('repeat', None)
+
+        timer = Timer.temporary(event=event, args=args, kwargs=kwargs, expires=when, created=now,
+                                author_id=author_id, channel_id=channel_id, repeat=repeat)
         delta = (when - now).total_seconds()
-        if delta <= 60:
+        if delta <= 60 and repeat is None:
             # a shortcut for small timers
             self.bot.loop.create_task(self.short_timer_optimisation(delta, timer))
             return timer
 
-        query = """INSERT INTO reminders (event, extra, expires, created)
-                   VALUES ($1, $2::jsonb, $3, $4)
-                   RETURNING id;
-                """
-        row = await connection.fetchrow(query, event, {'args': args, 'kwargs': kwargs}, when, now)
-        timer.id = row[0]
+        await self.create_timers_bulk([timer], connection=connection)
+        return timer
 
-        # only set the data check if it can be waited on
-        if delta <= (86400 * 40):  # 40 days
-            self._have_data.set()
+    async def create_timers_bulk(self, timers, *, connection=None):
+        """Creates several timers with a single query.
 
-        # check if this timer is earlier than our currently run timer
-        if self._current_timer and when < self._current_timer.expires:
-            # cancel the task and re-run it
-            self._task.cancel()
-            self._task = self.bot.loop.create_task(self.dispatch_timers())
+        Parameters
+        -----------
+        timers: List[:class:`Timer`]
+            The timers to create, made with :meth:`Timer.temporary`.
+        connection: asyncpg.Connection
+            The connection to use for the DB request.
 
-        return timer
+        Returns
+        --------
+        List[:class:`Timer`]
+            The same timers, with their IDs filled in.
+        """
+        if not timers:
+            return timers
+
+        await self.save_timers(timers, connection=connection)
+
+        # timers after the loaded window get loaded with a later window, recurring ones are always in memory
+        scheduled = False
+        for timer in timers:
+            if timer.id % TIMER_SHARDS not in self._shards:
+                continue
+            if timer.repeat is not None or (self._loaded_until is not None and timer.expires < self._loaded_until):
+                self.schedule(timer)
+                scheduled = True
+        if scheduled:
+            self._have_data.set()
+
+        return timers
 
     async def check_idlerpg(self, message: discord.Message) -> bool:
         m = message.content.lower()
         if not (m.startswith('$') and m.endswith('r')):
             return False
-        elif m.startswith('$steal '):
-            await self.sudo(message, 'r 1h steal')
+
+        await self._upgraded.wait()
+        if m.startswith('$steal '):
+            await self.remind(message, message.created_at + datetime.timedelta(hours=1), 'steal')
         elif m.startswith('$pray '):
-            now = datetime.datetime.utcnow()
-            await self.sudo(message, f'r {23 - int(now.strftime("%H"))}h{59 - int(now.strftime("%M"))}m'
-                                     f'{60 - int(now.strftime("%S"))}s pray')
+            await self.remind_daily(message, 'pray')
         elif m.startswith('$daily '):
-            now = datetime.datetime.utcnow()
-            await self.sudo(message, f'r {23 - int(now.strftime("%H"))}h{59 - int(now.strftime("%M"))}m'
-                                     f'{60 - int(now.strftime("%S"))}s daily')
+            await self.remind_daily(message, 'daily')
         elif m.startswith('$adventure ') or m.startswith('$a '):
-            await self.sudo(message, f'r {m.split()[1]}h adventure')
+            hours = m.split()[1]
+            if not (hours.isdigit() and len(hours) <= 5):
+                return False
+            await self.remind(message, message.created_at + datetime.timedelta(hours=int(hours)), 'adventure')
         elif m.startswith('$trickortreat ') or m.startswith('$tot '):
-            await self.sudo(message, 'r 3h trick or treat')
+            await self.remind(message, message.created_at + datetime.timedelta(hours=3), 'trick or treat')
         else:
             return False
 
         return True
 
-    async def sudo(self, message: discord.Message, command: str):
-        msg = copy.copy(message)
-        msg.content = self.bot.command_prefix + command
-        await self.bot.process_commands(msg)
+    async def remind(self, message: discord.Message, when: datetime.datetime, text: str, *, repeat=None):
+        timer = await self.create_timer(when, 'reminder', message.author.id,
+                                        message.channel.id,
+                                        text,
+                                        created=message.created_at,
+                                        author_id=message.author.id,
+                                        channel_id=message.channel.id,
+                                        repeat=repeat,
+                                        message_id=message.id)
+        delta = time.human_timedelta(when, source=timer.created_at)
+        await message.channel.send(f'Alright {message.author.name}, in {delta}: {text}')
+
+    async def remind_daily(self, message: discord.Message, text: str):
+        # one reminder every day at reset, the first time they do it is enough
+        query = """SELECT expires, repeat
+                   FROM reminders
+                   WHERE event = 'reminder'
+                   AND author_id = $1
+                   AND repeat IS NOT NULL
+                   AND extra #>> '{args,2}' = $2
+                   LIMIT 1;
+                """
+        record = await self.bot.pool.fetchrow(query, message.author.id, text)
+        if record is None:
+            return await self.remind(message, next_reset(message.created_at), text, repeat=datetime.timedelta(days=1))
+
+        expires = next_occurrence(record['expires'], record['repeat'], message.created_at)
+        delta = time.human_timedelta(expires, source=message.created_at)
+        await message.channel.send(f'Alright {message.author.name}, in {delta}: {text}')
 
     @commands.group(aliases=['timer', 'remind', 'r'], usage='<when>', invoke_without_command=True)
     async def reminder(self, ctx: commands.Context, *, when: time.UserFriendlyTime(commands.clean_content, default='\u2026')):
@@ -242,6 +631,8 @@ class Reminder(commands.Cog):
                                         when.arg,
                                         connection=ctx.db,
                                         created=ctx.message.created_at,
+                                        author_id=ctx.author.id,
+                                        channel_id=ctx.channel.id,
                                         message_id=ctx.message.id)
         delta = time.human_timedelta(when.dt, source=timer.created_at)
         await ctx.send(f'Alright {ctx.author.name}, in {delta}: {when.arg}')
@@ -249,15 +640,15 @@ class Reminder(commands.Cog):
     @reminder.command(name='list')
     async def reminder_list(self, ctx):
         """Shows the 10 latest currently running reminders."""
-        query = """SELECT id, expires, extra #>> '{args,2}'
+        query = """SELECT id, expires, repeat, extra #>> '{args,2}'
                    FROM reminders
                    WHERE event = 'reminder'
-                   AND extra #>> '{args,0}' = $1
+                   AND author_id = $1
                    ORDER BY expires
                    LIMIT 10;
                 """
 
-        records = await ctx.db.fetch(query, str(ctx.author.id))
+        records = await ctx.db.fetch(query, ctx.author.id)
 
         if len(records) == 0:
             return await ctx.send('No currently running reminders.')
@@ -269,9 +660,16 @@ class Reminder(commands.Cog):
         else:
             e.set_footer(text=f'{len(records)} reminder{"s" if len(records) > 1 else ""}')
 
-        for _id, expires, message in records:
+        now = datetime.datetime.utcnow()
+        for _id, expires, repeat, message in records:
             shorten = textwrap.shorten(message, width=512)
-            e.add_field(name=f'{_id}: In {time.human_timedelta(expires)}', value=shorten, inline=False)
+            if repeat is None:
+                name = f'{_id}: In {time.human_timedelta(expires, source=now)}'
+            else:
+                expires = next_occurrence(expires, repeat, now)
+                name = (f'{_id}: In {time.human_timedelta(expires, source=now)}, '
+                        f'then every {time.human_timedelta(now + repeat, source=now)}')
+            e.add_field(name=name, value=shorten, inline=False)
 
         await ctx.send(embed=e)
 
@@ -284,28 +682,30 @@ class Reminder(commands.Cog):
         You must own the reminder to delete it, obviously.
         """
         if id.lower() == "last" or id.lower() == "latest" or id.lower() == "newest" or id.lower() == "youngest":
-            query = f'SELECT id FROM reminders WHERE CAST ( extra -> \'args\' ->> 0 as bigint ) = {ctx.author.id} ORDER BY created DESC;'
-            row = await self.bot.pool.fetchrow(query)
-            id = row[0]
+            query = """SELECT id
+                       FROM reminders
+                       WHERE event = 'reminder'
+                       AND author_id = $1
+                       ORDER BY created DESC
+                       LIMIT 1;
+                    """
+            id = await ctx.db.fetchval(query, ctx.author.id)
+            if id is None:
+                return await ctx.send('You do not have any reminders to delete.')
         else:
             id = int(id)
 
         query = """DELETE FROM reminders
                    WHERE id=$1
                    AND event = 'reminder'
-                   AND extra #>> '{args,0}' = $2;
+                   AND author_id = $2;
                 """
 
-        status = await ctx.db.execute(query, id, str(ctx.author.id))
+        status = await ctx.db.execute(query, id, ctx.author.id)
         if status == 'DELETE 0':
             return await ctx.send('Could not delete any reminders with that ID.')
 
-        # if the current timer is being deleted
-        if self._current_timer and self._current_timer.id == id:
-            # cancel the task and re-run it
-            self._task.cancel()
-            self._task = self.bot.loop.create_task(self.dispatch_timers())
-
+        self.unschedule(id)
         await ctx.send('Successfully deleted reminder.')
 
     @reminder.command(name='clear')
@@ -317,10 +717,10 @@ class Reminder(commands.Cog):
         query = """SELECT COUNT(*)
                    FROM reminders
                    WHERE event = 'reminder'
-                   AND extra #>> '{args,0}' = $1;
+                   AND author_id = $1;
                 """
 
-        author_id = str(ctx.author.id)
+        author_id = ctx.author.id
         total = await ctx.db.fetchrow(query, author_id)
         total = total[0]
         if total == 0:
@@ -330,8 +730,9 @@ class Reminder(commands.Cog):
         if not confirm:
             return await ctx.send('Aborting')
 
-        query = """DELETE FROM reminders WHERE event = 'reminder' AND extra #>> '{args,0}' = $1;"""
-        await ctx.db.execute(query, author_id)
+        query = """DELETE FROM reminders WHERE event = 'reminder' AND author_id = $1 RETURNING id;"""
+        for record in await ctx.db.fetch(query, author_id):
+            self.unschedule(record['id'])
         await ctx.send(f'Successfully deleted {formats.plural(total):reminder}.')
 
     @commands.Cog.listener()
@@ -339,27 +740,72 @@ class Reminder(commands.Cog):
         if not message.author.bot and message.channel.type == discord.ChannelType.text:
             await self.check_idlerpg(message)
 
-    @commands.Cog.listener()
-    async def on_reminder_timer_complete(self, timer):
-        author_id, channel_id, message = timer.args
+    async def get_channel(self, channel_id):
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            return channel
 
         try:
-            channel = self.bot.get_channel(channel_id) or (await self.bot.fetch_channel(channel_id))
+            channel = self._channels[channel_id]
+        except KeyError:
+            pass
+        else:
+            self._channels.move_to_end(channel_id)
+            return channel
+
+        try:
+            channel = await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            channel = None
         except discord.HTTPException:
-            return
+            return None
 
-        guild_id = channel.guild.id if isinstance(channel, discord.TextChannel) else '@me'
-        message_id = timer.kwargs.get('message_id')
-        msg = f'<@{author_id}>, {timer.human_delta}: {message}'
+        self._channels[channel_id] = channel
+        while len(self._channels) > CHANNEL_CACHE_SIZE:
+            self._channels.popitem(last=False)
+        return channel
 
-        if message_id:
-            msg = f'{msg}\n\n<https://discordapp.com/channels/{guild_id}/{channel.id}/{message_id}>'
+    async def deliver(self, channel_id):
+        """Send the reminders due in a channel, as few messages as fit them."""
+        await asyncio.sleep(DELIVERY_DELAY)
+        timers = self._deliveries.pop(channel_id)
 
-        try:
-            await channel.send(msg)
-        except discord.HTTPException:
+        channel = await self.get_channel(channel_id)
+        if channel is None:
             return
 
+        guild_id = channel.guild.id if isinstance(channel, discord.TextChannel) else '@me'
+        paginator = commands.Paginator(prefix=None, suffix=None)
+        for timer in timers:
+            author_id, _, message = timer.args
+            message_id = timer.kwargs.get('message_id')
+            msg = f'<@{author_id}>, {timer.human_delta}: {message}'
+            link = f'\n\n<https://discordapp.com/channels/{guild_id}/{channel.id}/{message_id}>' if message_id else ''
+
+            limit = paginator.max_size - len(link) - 10
+            if len(msg) > limit:
+                msg = msg[:limit - 1] + '\N{HORIZONTAL ELLIPSIS}'
+            paginator.add_line(msg + link, empty=True)
+
+        for page in paginator.pages:
+            try:
+                await channel.send(page)
+            except discord.NotFound:
+                self._channels.pop(channel_id, None)
+                return
+            except discord.HTTPException:
+                return
+
+    @commands.Cog.listener()
+    async def on_reminder_timer_complete(self, timer):
+        channel_id = timer.args[1]
+        # reminders due around the same time in a channel are sent together
+        timers = self._deliveries.get(channel_id)
+        if timers is None:
+            timers = self._deliveries[channel_id] = []
+            self.bot.loop.create_task(self.deliver(channel_id))
+        timers.append(timer)
+
 
 def setup(bot):
     bot.add_cog(Reminder(bot))
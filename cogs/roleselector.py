@@ -3,13 +3,17 @@ from __future__ import annotations
 import discord
 from discord.ext import commands
 import asyncpg
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 import asyncio
 import emoji as amoji
+import time
+import re
+import traceback
 from datetime import datetime
 
 from .utils import db
 from .utils import selecting
+from .utils.roles import RoleQueue, DIGEST_DELAY, REPLY_LIFETIME
 from.utils.formats import human_date, human_join
 
 from bot import is_bot_admin, owner_or_guild_permissions
@@ -28,9 +32,22 @@ class Rolemenus(db.Table):
     last_edited_by = db.Column(db.Integer(big=True))  # User who last edited the menu (ID)
     last_edited_at = db.Column(db.Datetime)  # The last moment the menu was edited
     enabled = db.Column(db.Boolean, default=True)  # Specifies if the menu is enabled/disabled on purpose
+    notify = db.Column(db.String, default='dm')  # How members are told about their role changes (one of NOTIFY_MODES)
 
 
-menus = {}
+menus = {}  # (channel ID, message ID) -> SelectionMenu
+
+LOAD_CONCURRENCY = 10  # How many menus are loaded at the same time on startup
+LOAD_REPORT_EVERY = 100  # How many menus are loaded between progress reports on startup
+RESYNC_CONCURRENCY = 3  # How many menus have their reactions checked at the same time after startup
+
+custom_emoji_re = re.compile(r'^(?:<a?:\w+:)?(\d+)>?$')  # An emoji ID, or <:name:ID> as older menus stored them
+NOTIFY_MODES = {
+    'dm': 'a direct message for every change',
+    'digest': f'one direct message with all changes, once they stopped reacting for {DIGEST_DELAY} seconds',
+    'channel': f'a short reply in the channel of the menu, deleted after {REPLY_LIFETIME} seconds',
+    'none': 'no messages at all',
+}
 
 
 def make_message(description, roles, emojis, role_descs, status=True) -> str:
@@ -44,116 +61,188 @@ def make_message(description, roles, emojis, role_descs, status=True) -> str:
 
 
 async def get_menu_from_link(ctx, url) -> Optional[SelectionMenu]:
-    IDs = url.split('/')[-3:]
-    IDs[0] = int(IDs[0])
-    if IDs[0] not in menus.keys() or (int(IDs[0]) != ctx.guild.id and ctx.author.id not in ctx.bot.admins):
+    try:
+        guild_id, channel_id, message_id = (int(ID) for ID in url.split('/')[-3:])
+    except ValueError:
+        guild_id = channel_id = message_id = None
+    menu = menus.get((channel_id, message_id))
+    if not menu or menu.guild.id != guild_id or (guild_id != ctx.guild.id and ctx.author.id not in ctx.bot.admins):
         await ctx.send('Please provide a valid message URL of a menu on this server.')
         return None
-    if IDs[1]+','+IDs[2] not in menus[IDs[0]].keys():
-        await ctx.send('Please provide a valid message URL of a menu on this server.')
-        return None
-    return menus[IDs[0]][str(IDs[1])+','+str(IDs[2])]
+    return menu
+
+
+def menu_from_payload(payload: discord.RawReactionActionEvent) -> Optional[SelectionMenu]:
+    """The menu a reaction was added to or removed from, if it was a menu."""
+    return menus.get((payload.channel_id, payload.message_id))
+
+
+def emoji_key(emoji: Union[discord.Emoji, discord.PartialEmoji, str]) -> Union[int, str]:
+    """What an emoji is recognised by in a menu: its ID for custom emojis, the emoji itself for unicode ones."""
+    if isinstance(emoji, str):
+        return emoji
+    return emoji.id or emoji.name
+
+
+def emoji_value(emoji: Union[discord.Emoji, discord.PartialEmoji, str]) -> str:
+    """How an emoji is stored in the database: its ID for custom emojis, the emoji itself for unicode ones."""
+    return str(emoji_key(emoji))
 
 
 class SelectionMenu:
-    def __init__(self, message, description, roles, emojis, role_descs, allow_multiple, created_by, created_at, last_edited_by=None, last_edited_at=None, status=True, issues=None):
-        self.message: discord.Message = message
+    __slots__ = ('channel', 'message_id', 'message', 'description', 'roles', 'emojis', 'role_descs', 'allow_multiple',
+                 'created_by', 'created_at', 'last_edited_by', 'last_edited_at', 'status', 'issues', 'ignore_next',
+                 'role_ids', 'notify', '_message_lock')
+
+    def __init__(self, channel, message_id, description, roles, emojis, role_descs, allow_multiple, created_by, created_at, last_edited_by=None, last_edited_at=None, status=True, issues=None, message=None, notify='dm'):
+        self.channel: discord.TextChannel = channel
+        self.message_id: int = message_id
+        self.message: Optional[discord.Message] = message  # Only fetched once it is needed, use fetch_message()
         self.description: str = description
         self.roles: List[discord.Role] = roles
         self.emojis: List[Union[discord.Emoji, discord.PartialEmoji, str]] = emojis
         self.role_descs: List[str] = role_descs  # description text per role
         self.allow_multiple: bool = allow_multiple
-        self.created_by: discord.User = created_by
+        self.created_by: int = created_by  # (ID)
         self.created_at: datetime = created_at
-        self.last_edited_by: Optional[discord.User] = last_edited_by
+        self.last_edited_by: Optional[int] = last_edited_by  # (ID)
         self.last_edited_at: Optional[datetime] = last_edited_at
         self.status: bool = status
         self.issues: Optional[List[List[str, int]]] = issues
         self.ignore_next = False  # Used to ignore a reaction being deleted when it is the bot that deletes it
-
-    async def reaction_received(self, emoji: Union[discord.Emoji, discord.PartialEmoji, str], member: discord.Member):
-        if emoji not in self.emojis:
+        self.role_ids: Dict[Union[int, str], int] = {}  # emoji key -> ID of the role it gives
+        self.notify: str = notify  # One of NOTIFY_MODES
+        self._message_lock = asyncio.Lock()
+        self.update_role_ids()
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.channel.guild
+
+    @property
+    def jump_url(self) -> str:
+        return f'https://discord.com/channels/{self.guild.id}/{self.channel.id}/{self.message_id}'
+
+    async def fetch_message(self) -> discord.Message:
+        """The message of the menu, it is fetched the first time it is needed."""
+        if self.message is None:
+            async with self._message_lock:
+                if self.message is None:
+                    self.message = await self.channel.fetch_message(self.message_id)
+        return self.message
+
+    async def sync_reactions(self):
+        """Make the reactions on the message match the emojis of the menu, only removing and adding what changed.
+
+        Reactions are never re-added to follow the order of the roles, the text of the menu shows that order.
+        """
+        # fetched again, the reactions of a fetched message are not kept up to date
+        self.message = message = await self.channel.fetch_message(self.message_id)
+        reactions = {emoji_key(reaction.emoji): reaction for reaction in message.reactions}
+        wanted = {emoji_key(emoji) for emoji in self.emojis if emoji}
+        for key, reaction in reactions.items():
+            if key not in wanted:
+                await message.clear_reaction(reaction.emoji)
+        for emoji in self.emojis:
+            reaction = reactions.get(emoji_key(emoji)) if emoji else None
+            if emoji and not (reaction and reaction.me):
+                await message.add_reaction(emoji)
+
+    def update_role_ids(self):
+        """Has to be called whenever the roles or emojis change."""
+        self.role_ids = {emoji_key(emoji): role.id for emoji, role in zip(self.emojis, self.roles) if emoji and role}
+
+    def notify_member(self, queue: RoleQueue, member: discord.Member, content: str):
+        """Tell a member about a role change the way the menu is set up to."""
+        if self.notify == 'dm':
+            queue.send(member, f'**{self.guild}:** {content}')
+        elif self.notify == 'digest':
+            queue.digest(member, f'**{self.guild}:** {content}')
+        elif self.notify == 'channel':
+            queue.reply(self.channel, f'{member.mention} {content}')
+
+    def notify_owner(self, queue: RoleQueue, content: str):
+        """Tell the server owner about a problem with the menu, the owner isn't always cached."""
+        if self.guild.owner is not None:
+            queue.send(self.guild.owner, f'**{self.guild}:** {content}')
+
+    async def reaction_received(self, emoji: discord.PartialEmoji, member: discord.Member, queue: RoleQueue):
+        role = self.guild.get_role(self.role_ids.get(emoji_key(emoji)))
+        if not role:
             self.ignore_next = True
-            await self.message.remove_reaction(emoji, member)
+            await (await self.fetch_message()).remove_reaction(emoji, member)
             return
 
-        if not member.dm_channel:
-            await member.create_dm()
-
         if not self.status:
             self.ignore_next = True
-            await self.message.remove_reaction(emoji, member)
-            return await member.dm_channel.send(f'**{self.message.guild}:** the menu you tried to use is currently out of service, sorry for the inconvenience.')
+            await (await self.fetch_message()).remove_reaction(emoji, member)
+            return self.notify_member(queue, member, 'the menu you tried to use is currently out of service, sorry for the inconvenience.')
 
-        role = self.roles[self.emojis.index(emoji)]
-        if role in member.roles:
-            return await member.dm_channel.send(f'**{self.message.guild}:** you already have the **{role}** role.')
+        # includes the changes still waiting in the queue, so quick reactions are checked against each other
+        role_ids = queue.role_ids(member)
+        if role.id in role_ids:
+            return self.notify_member(queue, member, f'you already have the **{role}** role.')
         if not self.allow_multiple:
             for r in self.roles:
-                if r in member.roles:
+                if r and r.id in role_ids:
                     self.ignore_next = True
-                    await self.message.remove_reaction(emoji, member)
-                    return await member.dm_channel.send(f'**{self.message.guild}:** you already have a role from this'
-                                                        f' menu, you must first remove **{r}** if you want **{role}**.')
+                    await (await self.fetch_message()).remove_reaction(emoji, member)
+                    return self.notify_member(queue, member, f'you already have a role from this'
+                                                             f' menu, you must first remove **{r}** if you want **{role}**.')
 
         try:
-            await member.add_roles(role, reason=f'Selected role ({self.message.jump_url})')
-            await member.dm_channel.send(f'**{self.message.guild}:** gave you the **{role}** role.')
+            if await queue.change(member, add=role, reason=f'Selected role ({self.jump_url})'):
+                self.notify_member(queue, member, f'gave you the **{role}** role.')
         except discord.Forbidden:
             self.ignore_next = True
-            await self.message.remove_reaction(emoji, member)
-            guild_owner = self.message.guild.owner
-            if not guild_owner.dm_channel:
-                await guild_owner.create_dm()
-            await guild_owner.dm_channel.send(f'**{self.message.guild}:** I do not have the required permissions to give'
-                                              f' **{member}** the **{role}** role on your server. I need "Manage Roles"'
-                                              f' permissions and my highest role needs to be higher than the roles you'
-                                              f' want me to add/remove.')
-            await member.dm_channel.send(f'**{self.message.guild}:** I don\'t have permission to give you the **{role}**'
-                                         f' role. I have contacted the server owner about this.')
-
-    async def reaction_removed(self, emoji: Union[discord.Emoji, discord.PartialEmoji, str], member: discord.Member):
+            await (await self.fetch_message()).remove_reaction(emoji, member)
+            self.notify_owner(queue, f'I do not have the required permissions to give **{member}** the **{role}**'
+                                     f' role on your server. I need "Manage Roles" permissions and my highest role'
+                                     f' needs to be higher than the roles you want me to add/remove.')
+            self.notify_member(queue, member, f'I don\'t have permission to give you the **{role}**'
+                                              f' role. I have contacted the server owner about this.')
+
+    async def reaction_removed(self, emoji: discord.PartialEmoji, member: discord.Member, queue: RoleQueue):
         if self.ignore_next:
             self.ignore_next = False
             return
 
-        if not member.dm_channel:
-            await member.create_dm()
+        role = self.guild.get_role(self.role_ids.get(emoji_key(emoji)))
+        if not role:
+            return
 
         if not self.status:
-            await self.message.remove_reaction(emoji, member)
-            return await member.dm_channel.send(f'**{self.message.guild}:** the menu you tried to use is currently out of service, sorry for the inconvenience.')
+            await (await self.fetch_message()).remove_reaction(emoji, member)
+            return self.notify_member(queue, member, 'the menu you tried to use is currently out of service, sorry for the inconvenience.')
 
-        role = self.roles[self.emojis.index(emoji)]
-        if role not in member.roles:
-            return await member.dm_channel.send(f'**{self.message.guild}:** you do not have the **{role}** role so I couldn\'t remove it.')
+        if role.id not in queue.role_ids(member):
+            return self.notify_member(queue, member, f'you do not have the **{role}** role so I couldn\'t remove it.')
 
         try:
-            await member.remove_roles(role, reason=f'Removed role ({self.message.jump_url})')
-            await member.dm_channel.send(f'**{self.message.guild}:** removed the **{role}** role.')
+            if await queue.change(member, remove=role, reason=f'Removed role ({self.jump_url})'):
+                self.notify_member(queue, member, f'removed the **{role}** role.')
         except discord.Forbidden:
-            guild_owner = self.message.guild.owner
-            if not guild_owner.dm_channel:
-                await guild_owner.create_dm()
-            await guild_owner.dm_channel.send(f'**{self.message.guild}:** I do not have the required permissions to'
-                                              f' remove the **{role}** role from **{member}** on your server. I need'
-                                              f' "Manage Roles" permissions and my highest role needs to be higher than'
-                                              f' the roles you want me to add/remove.')
-            await member.dm_channel.send(f'**{self.message.guild}:** I don\'t have permission to remove the **{role}**'
-                                         f' role from you. I have contacted the server owner about this.')
+            self.notify_owner(queue, f'I do not have the required permissions to remove the **{role}** role from'
+                                     f' **{member}** on your server. I need "Manage Roles" permissions and my highest'
+                                     f' role needs to be higher than the roles you want me to add/remove.')
+            self.notify_member(queue, member, f'I don\'t have permission to remove the **{role}**'
+                                              f' role from you. I have contacted the server owner about this.')
 
 
 class RoleSelector(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self._task = bot.loop.create_task(self.get_menus())
+        self._resync_task = None
+
+    def cog_unload(self):
+        self._task.cancel()
+        if self._resync_task:
+            self._resync_task.cancel()
 
     @commands.group(name='roleselector', aliases=['rselector', 'rolesel', 'rsel', 'rs', 'rolemenu', 'rmenu'])
     async def role_selector(self, ctx: commands.Context):
         """All commands revolving around the role selection menus."""
-        if ctx.guild.id not in menus.keys():
-            menus[ctx.guild.id] = {}
-
         if not ctx.invoked_subcommand:
             await ctx.send(f'Use `{ctx.prefix}help roleselector` for the possible commands.')
 
@@ -262,13 +351,12 @@ class RoleSelector(commands.Cog):
 
         query = 'INSERT INTO rolemenus VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, NULL, NULL, True);'
         await self.bot.pool.fetchval(query, ctx.guild.id, [channel.id, menu_message.id], description, [role.id for role in roles],
-                                     [str(emoji.id) if type(emoji) != str else emoji for emoji in emojis], role_descs,
+                                     [emoji_value(emoji) for emoji in emojis], role_descs,
                                      allow_multiple, ctx.author.id, created_at)
 
         await ctx.send(f'Here it is: {menu_message.jump_url}')
-        menus[channel.guild.id][str(channel.id)+','+str(menu_message.id)] = SelectionMenu(menu_message, description, roles,
-                                                                                          emojis, role_descs, allow_multiple,
-                                                                                          ctx.author, created_at)
+        menus[channel.id, menu_message.id] = SelectionMenu(channel, menu_message.id, description, roles, emojis, role_descs,
+                                                           allow_multiple, ctx.author.id, created_at, message=menu_message)
 
     @role_selector.command()
     @owner_or_guild_permissions(manage_roles=True)
@@ -287,8 +375,9 @@ class RoleSelector(commands.Cog):
 
         menu.status = True
         query = 'UPDATE rolemenus SET enabled = True WHERE message = $1;'
-        await self.bot.pool.fetchval(query, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=menu.message.content.split('\n', 2)[2:][0])
+        await self.bot.pool.fetchval(query, [menu.channel.id, menu.message_id])
+        message = await menu.fetch_message()
+        await message.edit(content=message.content.split('\n', 2)[2:][0])
         await ctx.send('Successfully enabled.')
 
     @role_selector.command()
@@ -304,8 +393,9 @@ class RoleSelector(commands.Cog):
 
         menu.status = False
         query = 'UPDATE rolemenus SET enabled = False WHERE message = $1;'
-        await self.bot.pool.fetchval(query, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content='***This menu is currently out of service***\n\n'+menu.message.content)
+        await self.bot.pool.fetchval(query, [menu.channel.id, menu.message_id])
+        message = await menu.fetch_message()
+        await message.edit(content='***This menu is currently out of service***\n\n'+message.content)
         await ctx.send('Successfully disabled.')
 
     @role_selector.command()
@@ -328,11 +418,12 @@ class RoleSelector(commands.Cog):
         menu.roles.append(role)
         menu.emojis.append(emoji)
         menu.role_descs.append(description)
-        query = 'UPDATE rolemenus SET roles = array_append(roles, $1), emojis = array_append(emojis, $2), role_descs = array_append(role_descs, $3) WHERE message = $4;'
-        await self.bot.pool.fetchval(query, role.id, str(emoji) if type(emoji) != str else emoji, description, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=menu.message.content+f'\n\n{emoji}: **{role.name}**'+(f'\n{description}' if description else ''))
-        await menu.message.add_reaction(emoji)
-        await self.update_last_edit(menu, ctx.author)
+        menu.update_role_ids()
+        await self.save_edit(menu, ctx.author, 'roles = array_append(roles, $1), emojis = array_append(emojis, $2), role_descs = array_append(role_descs, $3)',
+                             role.id, emoji_value(emoji), description)
+        message = await menu.fetch_message()
+        await message.edit(content=message.content+f'\n\n{emoji}: **{role.name}**'+(f'\n{description}' if description else ''))
+        await message.add_reaction(emoji)
         await ctx.send(f'Successfully added **{role}**.')
 
     @role_selector.command()
@@ -357,12 +448,14 @@ class RoleSelector(commands.Cog):
         index = menu.roles.index(role)
         menu.roles.pop(index)
         emoji = menu.emojis.pop(index)
-        role_desc = menu.role_descs.pop(index)
-        query = 'UPDATE rolemenus SET roles = array_remove(roles, $1), emojis = array_remove(emojis, $2), role_descs = array_remove(role_descs, $3) WHERE message = $4;'
-        await self.bot.pool.fetchval(query, role.id, str(emoji.id) if type(emoji) != str else emoji, role_desc, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
-        await menu.message.clear_reaction(emoji)
-        await self.update_last_edit(menu, ctx.author)
+        menu.role_descs.pop(index)
+        menu.update_role_ids()
+        # removed by position, the same emoji ID or description could be in the arrays more than once
+        await self.save_edit(menu, ctx.author, 'roles = roles[:$1 - 1] || roles[$1 + 1:], emojis = emojis[:$1 - 1] || emojis[$1 + 1:], '
+                                               'role_descs = role_descs[:$1 - 1] || role_descs[$1 + 1:]', index + 1)
+        message = await menu.fetch_message()
+        await message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
+        await message.clear_reaction(emoji)
         await ctx.send(f'Successfully removed **{role}**.')
 
     @role_selector.command(aliases=['changemoji', 'editemoji', 'newemoji'])
@@ -387,15 +480,13 @@ class RoleSelector(commands.Cog):
         if type(emoji) == str and emoji not in amoji.EMOJI_UNICODE.values():
             return await ctx.send(f'Please give me a valid emoji.')
 
-        old_emoji = menu.emojis[menu.roles.index(role)]
-        menu.emojis[menu.roles.index(role)] = emoji
-        query = 'UPDATE rolemenus SET emojis = array_replace(emojis, $1, $2) WHERE message = $3;'
-        await self.bot.pool.fetchval(query, str(old_emoji.id) if type(old_emoji) != str else old_emoji, str(emoji.id) if type(emoji) != str else emoji, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
-        await menu.message.clear_reactions()
-        for e in menu.emojis:
-            await menu.message.add_reaction(e)
-        await self.update_last_edit(menu, ctx.author)
+        index = menu.roles.index(role)
+        menu.emojis[index] = emoji
+        menu.update_role_ids()
+        await self.save_edit(menu, ctx.author, 'emojis[$1] = $2', index + 1, emoji_value(emoji))
+        message = await menu.fetch_message()
+        await message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
+        await menu.sync_reactions()
         await ctx.send('Successfully changed the emoji.')
 
     @role_selector.command(aliases=['changeroledescription', 'changerdesc', 'editroledesc', 'roledescription', 'roledesc'])
@@ -411,11 +502,10 @@ class RoleSelector(commands.Cog):
         if description == menu.role_descs[menu.roles.index(role)]:
             return await ctx.send('This is already the description for this role:thinking:')
 
-        menu.role_descs[menu.roles.index(role)] = description
-        query = 'UPDATE rolemenus SET role_descs = $1 WHERE message = $2;'  # This query is not using the PostgreSQL array_replace() function because role descriptions do not have to be unique
-        await self.bot.pool.fetchval(query, menu.role_descs, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
-        await self.update_last_edit(menu, ctx.author)
+        index = menu.roles.index(role)
+        menu.role_descs[index] = description
+        await self.save_edit(menu, ctx.author, 'role_descs[$1] = $2', index + 1, description)
+        await (await menu.fetch_message()).edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
         await ctx.send(f'Successfully {"changed" if description else "removed"} role description.')
 
     @role_selector.command(aliases=['description'])
@@ -429,12 +519,34 @@ class RoleSelector(commands.Cog):
             return await ctx.send('But that is already the description:thinking:')
 
         menu.description = description
-        query = 'UPDATE rolemenus SET description = $1 WHERE message = $2;'
-        await self.bot.pool.fetchval(query, description, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=make_message(description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
-        await self.update_last_edit(menu, ctx.author)
+        await self.save_edit(menu, ctx.author, 'description = $1', description)
+        await (await menu.fetch_message()).edit(content=make_message(description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
         await ctx.send('Successfully changed description.')
 
+    @role_selector.command(aliases=['notifications'])
+    @owner_or_guild_permissions(manage_roles=True)
+    async def notify(self, ctx: commands.Context, menu_url, mode: str.lower):
+        """Choose how members are told about the roles they get or lose from a menu.
+
+        `dm`: a direct message for every change (default)
+        `digest`: one direct message with all changes, once they stopped reacting for a while
+        `channel`: a short reply in the channel of the menu that deletes itself again
+        `none`: no messages at all
+        """
+        menu = await get_menu_from_link(ctx, menu_url)
+        if not menu:
+            return
+
+        if mode not in NOTIFY_MODES:
+            return await ctx.send('Choose one of these:\n' + '\n'.join(f'`{m}`: {description}'
+                                                                    for m, description in NOTIFY_MODES.items()))
+        if mode == menu.notify:
+            return await ctx.send('The menu already does that:thinking:')
+
+        menu.notify = mode
+        await self.save_edit(menu, ctx.author, 'notify = $1', mode)
+        await ctx.send(f'Members will now get {NOTIFY_MODES[mode]}.')
+
     @role_selector.command(aliases=['order'])
     @owner_or_guild_permissions(manage_roles=True)
     async def reorder(self, ctx: commands.Context, menu_url, *order: int):
@@ -454,13 +566,11 @@ class RoleSelector(commands.Cog):
         menu.roles = [menu.roles[index - 1] for index in order]
         menu.emojis = [menu.emojis[index - 1] for index in order]
         menu.role_descs = [menu.role_descs[index - 1] for index in order]
-        query = 'UPDATE rolemenus SET roles = $1, emojis = $2, role_descs = $3 WHERE message = $4;'
-        await self.bot.pool.fetchval(query, [role.id for role in menu.roles], [str(emoji.id) if type(emoji) != str else emoji for emoji in menu.emojis], menu.role_descs, [menu.message.channel.id, menu.message.id])
-        await menu.message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
-        await menu.message.clear_reactions()
-        for emoji in menu.emojis:
-            await menu.message.add_reaction(emoji)
-        await self.update_last_edit(menu, ctx.author)
+        menu.update_role_ids()
+        await self.save_edit(menu, ctx.author, ', '.join(f'{column} = (SELECT array_agg({column}[i] ORDER BY n) FROM unnest($1::int[]) WITH ORDINALITY AS o(i, n))'
+                                                         for column in ('roles', 'emojis', 'role_descs')), list(order))
+        message = await menu.fetch_message()
+        await message.edit(content=make_message(menu.description, menu.roles, menu.emojis, menu.role_descs, status=menu.status))
         await ctx.send('Successfully re-ordered.')
 
     @role_selector.command(aliases=['transport'])
@@ -474,23 +584,24 @@ class RoleSelector(commands.Cog):
         if not menu:
             return
 
-        if channel == menu.message.channel:
+        if channel == menu.channel:
             return await ctx.send('The menu is already in that channel:thinking:')
 
-        if channel.guild != menu.message.guild:
+        if channel.guild != menu.guild:
             return await ctx.send('You have to move it to a channel in the same server.')
 
-        new_message = await channel.send(menu.message.content)
+        message = await menu.fetch_message()
+        new_message = await channel.send(message.content)
         for emoji in menu.emojis:
             await new_message.add_reaction(emoji)
         query = 'UPDATE rolemenus SET message = $1 WHERE message = $2;'
-        await self.bot.pool.fetchval(query, [channel.id, new_message.id], [menu.message.channel.id, menu.message.id])
-        menus[channel.guild.id][str(channel.id)+','+str(new_message.id)] = menus[menu.message.guild.id].pop(str(menu.message.channel.id)+','+str(menu.message.id))
-        await menu.message.delete()
-        for emoji in menu.emojis:
-            await new_message.add_reaction(emoji)
+        await self.bot.pool.fetchval(query, [channel.id, new_message.id], [menu.channel.id, menu.message_id])
+        menus[channel.id, new_message.id] = menus.pop((menu.channel.id, menu.message_id))
+        menu.channel = channel
+        menu.message_id = new_message.id
         menu.message = new_message
-        await ctx.send(f'Here it is: {menu.message.jump_url}')
+        await message.delete()
+        await ctx.send(f'Here it is: {menu.jump_url}')
 
     @role_selector.command(aliases=['remove'])
     @owner_or_guild_permissions(manage_roles=True)
@@ -509,16 +620,22 @@ class RoleSelector(commands.Cog):
             return await ctx.send('Timed out.')
 
         query = 'DELETE FROM rolemenus WHERE message = $1;'
-        await self.bot.pool.fetchval(query, [menu.message.channel.id, menu.message.id])
-        await menu.message.delete()
-        del (menus[menu.message.guild.id][str(menu.message.channel.id)+','+str(menu.message.id)])
+        await self.bot.pool.fetchval(query, [menu.channel.id, menu.message_id])
+        await (await menu.fetch_message()).delete()
+        del menus[menu.channel.id, menu.message_id]
         await ctx.send('Successfully deleted the menu.')
 
-    async def update_last_edit(self, menu: SelectionMenu, user):
+    async def save_edit(self, menu: SelectionMenu, user, changes: str, *args):
+        """Save an edit of a menu together with who made it and when, in a single statement.
+
+        `changes` are the assignments of the UPDATE, with $1, $2... for the `args`. The roles, emojis and role
+        descriptions are parallel arrays, so edits of them should change all three by position at once.
+        """
         moment = datetime.utcnow()
-        query = 'UPDATE rolemenus SET last_edited_by = $1, last_edited_at = $2 WHERE message = $3;'
-        await self.bot.pool.fetchval(query, user.id, moment, [menu.message.channel.id, menu.message.id])
-        menu.last_edited_by = user
+        query = f'UPDATE rolemenus SET {changes}, last_edited_by = ${len(args) + 1}, last_edited_at = ${len(args) + 2} ' \
+                f'WHERE message = ${len(args) + 3};'
+        await self.bot.pool.execute(query, *args, user.id, moment, [menu.channel.id, menu.message_id])
+        menu.last_edited_by = user.id
         menu.last_edited_at = moment
 
     @role_selector.command()
@@ -531,7 +648,12 @@ class RoleSelector(commands.Cog):
         if not menu:
             return
 
-        embed = discord.Embed(title='Selector Information', description=f'{"Multiple" if menu.allow_multiple else "Single"}-choice menu\nCreated by {menu.created_by} at {human_date(menu.created_at)}{f" and last edited by {menu.last_edited_by} at {human_date(menu.last_edited_at)}" if menu.last_edited_by else ""}\nThe menu is [here]({menu.message.jump_url})')
+        created_by = self.bot.get_user(menu.created_by) or await self.bot.fetch_user(menu.created_by)
+        last_edited_by = None
+        if menu.last_edited_by:
+            last_edited_by = self.bot.get_user(menu.last_edited_by) or await self.bot.fetch_user(menu.last_edited_by)
+
+        embed = discord.Embed(title='Selector Information', description=f'{"Multiple" if menu.allow_multiple else "Single"}-choice menu\nCreated by {created_by} at {human_date(menu.created_at)}{f" and last edited by {last_edited_by} at {human_date(menu.last_edited_at)}" if last_edited_by else ""}\nMembers get {NOTIFY_MODES[menu.notify]}\nThe menu is [here]({menu.jump_url})')
         embed.add_field(name='Menu description', value=menu.description, inline=False)
         for i in range(len(menu.roles)):
             embed.add_field(name=(str(menu.emojis[i]) if menu.emojis[i] else '*Emoji not found*'), value=f'{f"**{menu.roles[i].name}**" if menu.roles[i] else "*Role not found*"}\n{menu.role_descs[i] if menu.role_descs[i] else "No description"}')
@@ -543,112 +665,218 @@ class RoleSelector(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        emoji, message, member = await self.info_from_payload(payload)
-        if member == self.bot.user:
+        if payload.user_id == self.bot.user.id:
             return
 
-        if message.guild.id in menus.keys():
-            if str(message.channel.id)+','+str(message.id) in menus[message.guild.id].keys():
-                await menus[message.guild.id][str(message.channel.id)+','+str(message.id)].reaction_received(emoji, member)
+        menu = menu_from_payload(payload)
+        if not menu:
+            return
+
+        emoji, member = self.info_from_payload(payload)
+        if member:
+            await menu.reaction_received(emoji, member, self.bot.role_queue)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
-        emoji, message, member = await self.info_from_payload(payload)
-        if message.guild.id in menus.keys():
-            if str(message.channel.id)+','+str(message.id) in menus[message.guild.id].keys():
-                await menus[message.guild.id][str(message.channel.id)+','+str(message.id)].reaction_removed(emoji, member)
-
-    async def info_from_payload(self, payload: discord.RawReactionActionEvent):
-        guild: discord.Guild = self.bot.get_guild(payload.guild_id)
-        channel: discord.TextChannel = guild.get_channel(payload.channel_id)
-        message: discord.Message = await channel.fetch_message(payload.message_id)
-        emoji = payload.emoji
-        if emoji.is_custom_emoji():
-            emoji = await guild.fetch_emoji(emoji.id)
-        else:
-            emoji = emoji.name
-        member = guild.get_member(payload.user_id)
-        return emoji, message, member
+        menu = menu_from_payload(payload)
+        if not menu:
+            return
+
+        emoji, member = self.info_from_payload(payload)
+        if member:
+            await menu.reaction_removed(emoji, member, self.bot.role_queue)
+
+    def info_from_payload(self, payload: discord.RawReactionActionEvent):
+        """Get the emoji and member of a reaction from the gateway cache, without any API calls.
+
+        Menus recognise emojis by their key, so the partial emoji from the payload is as good as the full one.
+        """
+        member = payload.member or self.bot.get_guild(payload.guild_id).get_member(payload.user_id)
+        return payload.emoji, member
+
+    async def normalize_emojis(self):
+        """Store custom emojis by their ID in menus from before addrole did, it stored them as <:name:ID>."""
+        query = r"""UPDATE rolemenus
+                    SET emojis = ARRAY(SELECT regexp_replace(e.emoji, '^<a?:\w+:(\d+)>$', '\1')
+                                       FROM unnest(emojis) WITH ORDINALITY AS e(emoji, n)
+                                       ORDER BY e.n)
+                    WHERE EXISTS (SELECT 1 FROM unnest(emojis) AS e(emoji) WHERE e.emoji LIKE '<%>');
+                 """
+        await self.bot.pool.execute(query)
 
     async def get_menus(self):
-        """Get menus from database."""
+        """Get menus from database.
+
+        Roles and emojis come from the cache where possible, the rest is fetched for a few menus at a time. The
+        messages of the menus are only fetched once they are needed.
+        """
         if not self.bot.is_ready():
             await self.bot.wait_for('ready')
 
         try:
+            start = time.perf_counter()
             menus.clear()
+            await Rolemenus.upgrade()  # adds the notify column to menus from before it
+            await self.normalize_emojis()
             rows = await self.bot.pool.fetch('SELECT * FROM rolemenus')
-            for menu in rows:
-                guild = self.bot.get_guild(menu['guild'])
-                if not guild:
-                    print(f'Guild with id {menu["guild"]} not found. You can use the `unguild` command to clear '
-                          f'everything from this guild from the database.')
-                    continue
+            semaphore = asyncio.Semaphore(LOAD_CONCURRENCY)
+            done = 0
+
+            async def load(row):
+                nonlocal done
+                async with semaphore:
+                    try:
+                        await self.load_menu(row)
+                    except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+                        raise
+                    except Exception:
+                        # One broken menu shouldn't stop the others from loading
+                        print(f'Couldn\'t load the role menu with message {row["message"]}:')
+                        traceback.print_exc()
+                done += 1
+                if done % LOAD_REPORT_EVERY == 0:
+                    print(f'Loaded {done}/{len(rows)} role menus ({time.perf_counter() - start:.2f}s)')
+
+            await asyncio.gather(*(load(row) for row in rows))
+            print(f'Loaded {len(menus)} role menus in {time.perf_counter() - start:.2f}s '
+                  f'({len(rows) - len(menus)} could not be loaded).')
+            # Its own task, so a dropped connection while paging through reactions doesn't reload every menu
+            if self._resync_task:
+                self._resync_task.cancel()
+            self._resync_task = self.bot.loop.create_task(self.resync_menus())
+        except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
+            self._task.cancel()
+            self._task = self.bot.loop.create_task(self.get_menus())
 
-                channel = guild.get_channel(menu['message'][0])
-                if not channel:
-                    print(f'Channel with id {menu["message"][0]} not found in guild "{guild}" ({guild.id}). Contact the '
-                          f'guild owner ({guild.owner}) to check if I still have permission to this channel, or you can '
-                          f'use the `unchannel` command to clear everything from this channel from the database.')
-                    continue
+    async def resync_menus(self):
+        """Give the roles for reactions that were added while the bot was offline.
+
+        The reactions of a few menus at a time are paged through, and the roles are queued while paging.
+        """
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(RESYNC_CONCURRENCY)
 
+        async def resync(menu):
+            async with semaphore:
                 try:
-                    menu_message = await channel.fetch_message(menu['message'][1])
-                except:
-                    print(f'Couldn\'t find a role menu message (https://discordapp.com/channels/{guild.id}/{channel.id}/'
-                          f'{menu["message"][1]}) in guild "{guild}" in channel "{channel}". Contact the guild owner '
-                          f'({guild.owner}) to check if this message was removed. You can remove this menu from the database with the command '
-                          f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {menu["message"][1]}}}\'`.')
+                    return await self.resync_menu(menu)
+                except discord.HTTPException as e:
+                    print(f'Couldn\'t check the reactions of role menu {menu.jump_url}: {e}')
+                    return 0
+
+        try:
+            given = await asyncio.gather(*(resync(menu) for menu in list(menus.values()) if menu.status))
+        except (OSError, discord.ConnectionClosed):
+            # Start over once connected again, the members that got their roles already are skipped
+            await self.bot.wait_until_ready()
+            self._resync_task = self.bot.loop.create_task(self.resync_menus())
+            return
+        print(f'Checked the reactions of {len(given)} role menus in {time.perf_counter() - start:.2f}s, gave '
+              f'{sum(given)} roles that were selected while I was offline.')
+
+    async def resync_menu(self, menu: SelectionMenu) -> int:
+        """Give the roles of a menu to the members that reacted for them but don't have them, returns how many.
+
+        Members who have a role but no reaction are left alone, they might have got the role some other way.
+        """
+        queue = self.bot.role_queue
+        # fetched again, the reactions of a fetched message are not kept up to date
+        menu.message = message = await menu.channel.fetch_message(menu.message_id)
+        changes = []
+        for reaction in message.reactions:
+            role = menu.guild.get_role(menu.role_ids.get(emoji_key(reaction.emoji)))
+            if not role or reaction.count <= reaction.me:
+                continue
+
+            async for user in reaction.users():
+                member = menu.guild.get_member(user.id)
+                if not member or member.id == self.bot.user.id:
                     continue
+                # includes the roles queued earlier in this pass
+                role_ids = queue.role_ids(member)
+                if role.id in role_ids:
+                    continue
+                if not menu.allow_multiple and any(r and r.id in role_ids for r in menu.roles):
+                    continue
+                future = queue.change(member, add=role, reason=f'Selected role while I was offline ({menu.jump_url})')
+                changes.append((future, member, role))
+
+        results = await asyncio.gather(*(future for future, _, _ in changes), return_exceptions=True)
+        for result, (_, member, role) in zip(results, changes):
+            if result is True:
+                menu.notify_member(queue, member, f'gave you the **{role}** role you selected while I was offline.')
+        return sum(result is True for result in results)
+
+    async def load_menu(self, menu):
+        guild = self.bot.get_guild(menu['guild'])
+        if not guild:
+            print(f'Guild with id {menu["guild"]} not found. You can use the `unguild` command to clear '
+                  f'everything from this guild from the database.')
+            return
 
-                if guild.id not in menus.keys():
-                    menus[menu['guild']] = {}
-
-                issues = []  # A list of issues with getting roles or emojis. If this list is not empty, the status of this menu will be "False".
-
-                roles = []
-                for role_id in menu['roles']:
-                    role = guild.get_role(role_id)
-                    if not role:
-                        print(f'Couldn\'t find role with id {role_id} for menu {menu_message.jump_url} in guild "{guild}" '
-                              f'in channel "{channel}". Contact the server owner ({guild.owner}) to see if they removed '
-                              f'this role. You can remove this menu from the database with the command '
-                              f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {menu_message.id}}}\'`.')
-                        issues.append(['role', role_id])
-                        roles.append(None)
-                    else:
-                        roles.append(role)
+        channel = guild.get_channel(menu['message'][0])
+        if not channel:
+            print(f'Channel with id {menu["message"][0]} not found in guild "{guild}" ({guild.id}). Contact the '
+                  f'guild owner ({guild.owner}) to check if I still have permission to this channel, or you can '
+                  f'use the `unchannel` command to clear everything from this channel from the database.')
+            return
 
-                emojis = []
-                for emoji_id in menu['emojis']:
-                    if emoji_id in amoji.EMOJI_UNICODE.values():
-                        emojis.append(amoji.emojize(emoji_id))
-                    else:
-                        emoji_id = str(emoji_id)
-                        try:
-                            emojis.append(await guild.fetch_emoji(emoji_id))
-                        except:
-                            print(f'Couldn\'t find emoji with id {emoji_id} for menu {menu_message.jump_url} in guild '
-                                  f'"{guild}" in channel "{channel}". Contact the server owner ({guild.owner}) to see if '
-                                  f'they removed this emoji. You can remove this menu from the database with the command '
-                                  f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {menu_message.id}}}\'`.')
-                            issues.append(['emoji', emoji_id])
-                            emojis.append(None)
-
-                created_by = await self.bot.fetch_user(menu['created_by'])
-                last_edited_by = None
-                if menu['last_edited_by']:
-                    last_edited_by = await self.bot.fetch_user(menu['last_edited_by'])
-                status = True if (not issues) and menu['enabled'] else False
-                if (not status) and (not menu_message.content.startswith('***This menu is currently out of service***\n\n')):
-                    await menu_message.edit(content='***This menu is currently out of service***\n\n'+menu_message.content)
-                menus[guild.id][str(channel.id)+','+str(menu_message.id)] = \
-                    SelectionMenu(menu_message, menu['description'], roles, emojis, menu['role_descs'],
-                                  menu['allow_multiple'], created_by, menu['created_at'], last_edited_by=last_edited_by,
-                                  last_edited_at=menu['last_edited_at'], status=status, issues=issues)
-        except (OSError, discord.ConnectionClosed, asyncpg.PostgresConnectionError):
-            self._task.cancel()
-            self._task = self.bot.loop.create_task(self.get_menus())
+        message_id = menu['message'][1]
+        jump_url = f'https://discord.com/channels/{guild.id}/{channel.id}/{message_id}'
+        issues = []  # A list of issues with getting roles or emojis. If this list is not empty, the status of this menu will be "False".
+
+        roles = []
+        for role_id in menu['roles']:
+            role = guild.get_role(role_id)
+            if not role:
+                print(f'Couldn\'t find role with id {role_id} for menu {jump_url} in guild "{guild}" '
+                      f'in channel "{channel}". Contact the server owner ({guild.owner}) to see if they removed '
+                      f'this role. You can remove this menu from the database with the command '
+                      f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {message_id}}}\'`.')
+                issues.append(['role', role_id])
+                roles.append(None)
+            else:
+                roles.append(role)
+
+        emojis = []
+        for emoji_id in menu['emojis']:
+            if emoji_id in amoji.EMOJI_UNICODE.values():
+                emojis.append(amoji.emojize(emoji_id))
+                continue
+
+            match = custom_emoji_re.match(emoji_id)
+            emoji = self.bot.get_emoji(int(match.group(1))) if match else None
+            if not emoji and match:
+                try:
+                    emoji = await guild.fetch_emoji(int(match.group(1)))
+                except discord.HTTPException:
+                    pass
+            if not emoji:
+                print(f'Couldn\'t find emoji with id {emoji_id} for menu {jump_url} in guild '
+                      f'"{guild}" in channel "{channel}". Contact the server owner ({guild.owner}) to see if '
+                      f'they removed this emoji. You can remove this menu from the database with the command '
+                      f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {message_id}}}\'`.')
+                issues.append(['emoji', emoji_id])
+            emojis.append(emoji)
+
+        status = True if (not issues) and menu['enabled'] else False
+        selection_menu = SelectionMenu(channel, message_id, menu['description'], roles, emojis, menu['role_descs'],
+                                       menu['allow_multiple'], menu['created_by'], menu['created_at'],
+                                       last_edited_by=menu['last_edited_by'], last_edited_at=menu['last_edited_at'],
+                                       status=status, issues=issues, notify=menu.get('notify', 'dm'))
+        if not status:
+            # the only menus whose message is needed right away, to mark them as out of service
+            try:
+                menu_message = await selection_menu.fetch_message()
+            except discord.HTTPException:
+                print(f'Couldn\'t find a role menu message ({jump_url}) in guild "{guild}" in channel "{channel}". '
+                      f'Contact the guild owner ({guild.owner}) to check if this message was removed. You can remove '
+                      f'this menu from the database with the command '
+                      f'`sql DELETE FROM rolemenus WHERE message = \'{{{channel.id}, {message_id}}}\'`.')
+                return
+            if not menu_message.content.startswith('***This menu is currently out of service***\n\n'):
+                await menu_message.edit(content='***This menu is currently out of service***\n\n'+menu_message.content)
+        menus[channel.id, message_id] = selection_menu
 
     @commands.command(hidden=True)
     @is_bot_admin()
@@ -657,6 +885,16 @@ class RoleSelector(commands.Cog):
         print(menus)
         await ctx.send('Check the Python printer output for your results.')
 
+    @commands.command(hidden=True)
+    @is_bot_admin()
+    async def rolequeue(self, ctx: commands.Context):
+        """Show how the role queue is doing."""
+        queue = self.bot.role_queue
+        await ctx.send(f'**{queue.depth}** members waiting for role changes in **{queue.busy_guilds}** servers.\n'
+                       f'**{queue.changes}** changes made in **{queue.edits}** edits, **{queue.failures}** failed and '
+                       f'**{queue.retries}** retried.\n'
+                       f'Latency: **{queue.average_latency:.2f}s** on average, **{queue.max_latency:.2f}s** at most.')
+
     @commands.command(aliases=['iam', 'iwant', 'gimme'])
     async def giveme(self, ctx: commands.Context, role: discord.Role):
         """Give yourself a role from the list of roles you can give yourself."""
@@ -393,6 +393,37 @@ class Column:
         return ' '.join(builder)
 
 
+class Index:
+    """An index over several columns or expressions, for what ``Column(index=True)`` can't express.
+
+    Parameters
+    -----------
+    \*expressions: str
+        The columns or (parenthesised) expressions to index, e.g. ``'guild'``, ``'score DESC'``
+        or ``'(started_at + duration)'``.
+    name: Optional[str]
+        The name of the index, defaults to ``<table>_<attribute>_idx``.
+    """
+    __slots__ = ('expression', 'name')
+
+    def __init__(self, *expressions, name=None):
+        if not expressions:
+            raise SchemaError('An index needs at least one column or expression.')
+
+        self.expression = ', '.join(expressions)
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['expression'], name=data['name'])
+
+    def _to_dict(self):
+        return {'expression': self.expression, 'name': self.name}
+
+    def _create_index(self, table_name):
+        return 'CREATE INDEX IF NOT EXISTS {0.name} ON {1} ({0.expression});'.format(self, table_name)
+
+
 class PrimaryKeyColumn(Column):
     """Shortcut for a SERIAL PRIMARY KEY column."""
 
@@ -499,6 +530,7 @@ class TableMeta(type):
 
     def __new__(cls, name, parents, dct, **kwargs):
         columns = []
+        indexes = []
 
         try:
             table_name = kwargs['table_name']
@@ -516,8 +548,14 @@ class TableMeta(type):
                     value.index_name = '%s_%s_idx' % (table_name, value.name)
 
                 columns.append(value)
+            elif isinstance(value, Index):
+                if value.name is None:
+                    value.name = '%s_%s_idx' % (table_name, elem)
+
+                indexes.append(value)
 
         dct['columns'] = columns
+        dct['indexes'] = indexes
         return super().__new__(cls, name, parents, dct)
 
     def __init__(self, name, parents, dct, **kwargs):
@@ -818,14 +856,39 @@ class Table(metaclass=TableMeta):
         column_creations.append('PRIMARY KEY (%s)' % ', '.join(primary_keys))
         builder.append('(%s)' % ', '.join(column_creations))
         statements.append(' '.join(builder) + ';')
+        statements.extend(cls._create_indexes())
+        return '\n'.join(statements)
 
-        # handle the index creations
+    @classmethod
+    def _create_indexes(cls):
+        statements = []
         for column in cls.columns:
             if column.index:
                 fmt = 'CREATE INDEX IF NOT EXISTS {1.index_name} ON {0} ({1.name});'.format(cls.__tablename__, column)
                 statements.append(fmt)
+
+        for index in cls.indexes:
+            statements.append(index._create_index(cls.__tablename__))
+        return statements
+
+    @classmethod
+    def upgrade_table(cls):
+        """Generates the statements that create the table, or add the columns and indexes it is missing.
+
+        Unlike migrations, this never changes or drops anything, so it can run on every start.
+        """
+        statements = [cls.create_table(exists_ok=True).split('\n')[0]]
+        statements.extend('ALTER TABLE {0} ADD COLUMN IF NOT EXISTS {1};'.format(cls.__tablename__, column._create_table())
+                          for column in cls.columns if not column.primary_key)
+        statements.extend(cls._create_indexes())
         return '\n'.join(statements)
 
+    @classmethod
+    async def upgrade(cls, *, connection=None):
+        """Creates the table, or adds the columns and indexes that were added to it after it was created."""
+        async with MaybeAcquire(connection, pool=cls._pool) as con:
+            await con.execute(cls.upgrade_table())
+
     @classmethod
     async def insert(cls, connection=None, **kwargs):
         """Inserts an element to the table."""
@@ -862,6 +925,7 @@ class Table(metaclass=TableMeta):
         # nb: columns is ordered due to the ordered dict usage
         #     this is used to help detect renames
         x['columns'] = [a._to_dict() for a in cls.columns]
+        x['indexes'] = [a._to_dict() for a in cls.indexes]
         return x
 
     @classmethod
@@ -876,6 +940,7 @@ class Table(metaclass=TableMeta):
         self = cls()
         self.__tablename__ = data['name']
         self.columns = [Column.from_dict(a) for a in data['columns']]
+        self.indexes = [Index.from_dict(a) for a in data.get('indexes', [])]
         return self
 
     @classmethod
@@ -907,10 +972,10 @@ class Table(metaclass=TableMeta):
             before: str [The previous column name]
             after:  str [The new column name]
         drop_index:
-            name: str [The column name]
+            name: str [The column name, or the expression of an Index]
             index: str [The index name]
         add_index:
-            name: str [The column name]
+            name: str [The column name, or the expression of an Index]
             index: str [The index name]
         changed_constraints:
             name: str [The column name]
@@ -1035,6 +1100,25 @@ class Table(metaclass=TableMeta):
             upgrade.setdefault('remove_columns', []).extend(removed)
             downgrade.setdefault('add_columns', []).extend(removed)
 
+        # multi-column and expression indexes are matched by name,
+        # a changed index is simply dropped and created again
+        before_indexes = {index.name: index for index in before.indexes}
+        after_indexes = {index.name: index for index in self.indexes}
+        for name, index in after_indexes.items():
+            old = before_indexes.get(name)
+            if old is not None and old.expression == index.expression:
+                continue
+            if old is not None:
+                upgrade.setdefault('drop_index', []).append({'name': old.expression, 'index': name})
+                downgrade.setdefault('add_index', []).append({'name': old.expression, 'index': name})
+            upgrade.setdefault('add_index', []).append({'name': index.expression, 'index': name})
+            downgrade.setdefault('drop_index', []).append({'name': index.expression, 'index': name})
+
+        for name, index in before_indexes.items():
+            if name not in after_indexes:
+                upgrade.setdefault('drop_index', []).append({'name': index.expression, 'index': name})
+                downgrade.setdefault('add_index', []).append({'name': index.expression, 'index': name})
+
         return SchemaDiff(self, upgrade, downgrade)
 
 
@@ -1055,3 +1139,46 @@ def create_tables(*tables, verbose=True, loop=None):
 
 def dict_from_record(record: asyncpg.Record) -> dict:
     return dict([pair for pair in record.items()])
+
+
+class TrackedRecord:
+    """Keeps track of the changes made to a row, so only those get saved.
+
+    Subclasses set the table, the column identifying a row, and the class
+    the row is loaded into (which takes the row as the keyword argument ``d``).
+    The changes are saved when leaving the ``async with`` block::
+
+        async with Counter(record, pool) as counter:
+            counter.total_score += 1
+
+    The UPDATE is parameterised and lists the changed columns in sorted order,
+    so the same kind of change always uses the same prepared statement.
+    """
+    __slots__ = ('original', 'current', 'connection')
+    table = None
+    key = None
+    profile = None
+
+    def __init__(self, record, connection):
+        self.original = dict_from_record(record)
+        self.current = self.profile(d=dict(self.original))
+        self.connection = connection
+
+    def changes(self) -> dict:
+        """Get the columns that were changed with their new values."""
+        current = self.current.__dict__
+        return {key: current[key] for key in sorted(self.original) if current[key] != self.original[key]}
+
+    async def save(self):
+        changes = self.changes()
+        if changes:
+            columns = ', '.join(f'{column} = ${i}' for i, column in enumerate(changes, 2))
+            query = f'UPDATE {self.table} SET {columns} WHERE {self.key} = $1;'
+            await self.connection.execute(query, self.original[self.key], *changes.values())
+            self.original.update(changes)
+
+    async def __aenter__(self):
+        return self.current
+
+    async def __aexit__(self, typ, value, traceback):
+        await self.save()
@@ -0,0 +1,217 @@
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from typing import Optional, Set
+
+import discord
+from discord.ext import commands
+
+RETRY_DELAYS = (1, 5, 15)  # Seconds to wait before trying a role edit again when Discord rate limits us or has trouble
+DM_MAX_DELAY = 30  # Seconds a direct message waits at most for the role edits to be done
+DIGEST_DELAY = 60  # Seconds without new notifications before a digest is sent
+REPLY_DELAY = 2  # Seconds to collect notifications for a channel before replying
+REPLY_LIFETIME = 15  # Seconds before a reply in a channel is deleted again
+
+
+class PendingChange:
+    __slots__ = ('add', 'remove', 'reason', 'futures', 'queued_at')
+
+    def __init__(self):
+        self.add: Set[int] = set()  # IDs of the roles to give
+        self.remove: Set[int] = set()  # IDs of the roles to take away
+        self.reason: Optional[str] = None
+        self.futures = []  # One for every change that was combined into this one
+        self.queued_at = time.monotonic()
+
+
+class RoleQueue:
+    """Gives and takes away roles a guild at a time, with all the waiting changes for a member in a single edit.
+
+    Messages about the changes wait until no role changes are waiting, or at most DM_MAX_DELAY seconds. They can be
+    sent one at a time, collected into a digest per user or collected into a short-lived reply per channel.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._pending = {}  # guild ID -> OrderedDict of member ID -> PendingChange, in the order they were queued
+        self._applying = {}  # (guild ID, member ID) -> PendingChange being applied
+        self._workers = {}  # guild ID -> task applying the changes of that guild
+        self._idle = asyncio.Event(loop=bot.loop)  # Set when no role changes are waiting
+        self._idle.set()
+        self._messages = asyncio.Queue()  # (destination, content, seconds before deleting it, moment it was queued)
+        self._sender = None
+        self._digests = {}  # user ID -> (user, list of lines, handle of the call sending it)
+        self._replies = {}  # channel ID -> list of lines
+
+        # Metrics
+        self.changes = 0  # Changes queued
+        self.edits = 0  # Member edits made for them
+        self.failures = 0  # Member edits that failed
+        self.retries = 0
+        self.total_latency = 0.0  # Seconds between queueing and applying, summed over the changes
+        self.max_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        """How many members have role changes waiting."""
+        return sum(len(pending) for pending in self._pending.values()) + len(self._applying)
+
+    @property
+    def busy_guilds(self) -> int:
+        """How many guilds have role changes being made."""
+        return len(self._workers)
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.changes if self.changes else 0.0
+
+    def change(self, member: discord.Member, *, add: discord.Role = None, remove: discord.Role = None,
+               reason: str = None) -> asyncio.Future:
+        """Queue giving and/or taking away a role.
+
+        The future is done when the change has been made, with True if the member's roles changed and False if
+        they left. It has the HTTPException if Discord refused the edit.
+        """
+        guild_id = member.guild.id
+        pending = self._pending.setdefault(guild_id, OrderedDict())
+        change = pending.get(member.id)
+        if change is None:
+            change = pending[member.id] = PendingChange()
+
+        if add is not None:
+            change.remove.discard(add.id)
+            change.add.add(add.id)
+        if remove is not None:
+            change.add.discard(remove.id)
+            change.remove.add(remove.id)
+        change.reason = reason
+
+        future = self.bot.loop.create_future()
+        change.futures.append(future)
+        self.changes += 1
+        self._idle.clear()
+        if guild_id not in self._workers:
+            self._workers[guild_id] = self.bot.loop.create_task(self.work(guild_id))
+        return future
+
+    def role_ids(self, member: discord.Member) -> Set[int]:
+        """The IDs of the roles the member will have once their waiting changes are made."""
+        role_ids = {role.id for role in member.roles}
+        for change in (self._applying.get((member.guild.id, member.id)),
+                       self._pending.get(member.guild.id, {}).get(member.id)):
+            if change is not None:
+                role_ids = (role_ids | change.add) - change.remove
+        return role_ids
+
+    async def work(self, guild_id):
+        pending = self._pending[guild_id]
+        try:
+            while pending:
+                member_id, change = pending.popitem(last=False)
+                self._applying[guild_id, member_id] = change
+                try:
+                    await self.apply(guild_id, member_id, change)
+                finally:
+                    del self._applying[guild_id, member_id]
+        finally:
+            del self._workers[guild_id]
+            if not pending:
+                del self._pending[guild_id]
+            if not self._workers:
+                self._idle.set()
+
+    async def apply(self, guild_id, member_id, change: PendingChange):
+        guild = self.bot.get_guild(guild_id)
+        member = guild and guild.get_member(member_id)
+        if member is None:
+            return self.finish(change, False)
+
+        # the member's roles are taken at the last moment, so changes made in between aren't undone
+        roles = [role for role in member.roles if not role.is_default() and role.id not in change.remove]
+        has = {role.id for role in roles}
+        roles += [role for role in map(guild.get_role, change.add - has) if role is not None]
+        if {role.id for role in roles} == {role.id for role in member.roles if not role.is_default()}:
+            return self.finish(change, True)
+
+        for delay in RETRY_DELAYS + (None,):
+            try:
+                await member.edit(roles=roles, reason=change.reason)
+            except discord.HTTPException as e:
+                if delay is None or not (e.status == 429 or e.status >= 500):
+                    self.edits += 1
+                    self.failures += 1
+                    return self.finish(change, exception=e)
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                self.retries += 1
+                await asyncio.sleep(max(delay, float(retry_after or 0)))
+            else:
+                self.edits += 1
+                return self.finish(change, True)
+
+    def finish(self, change: PendingChange, result=None, *, exception=None):
+        latency = time.monotonic() - change.queued_at
+        self.total_latency += latency * len(change.futures)
+        self.max_latency = max(self.max_latency, latency)
+        for future in change.futures:
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def send(self, destination: discord.abc.Messageable, content: str, *, delete_after: float = None):
+        """Queue a message, it is sent once no role changes are waiting."""
+        self._messages.put_nowait((destination, content, delete_after, time.monotonic()))
+        if self._sender is None or self._sender.done():
+            self._sender = self.bot.loop.create_task(self.send_messages())
+
+    def send_pages(self, destination: discord.abc.Messageable, lines, *, delete_after: float = None):
+        paginator = commands.Paginator(prefix=None, suffix=None)
+        for line in lines:
+            paginator.add_line(line)
+        for page in paginator.pages:
+            self.send(destination, page, delete_after=delete_after)
+
+    def digest(self, user: discord.abc.User, content: str):
+        """Queue a line for a direct message that is sent once no lines were added for DIGEST_DELAY seconds."""
+        _, lines, handle = self._digests.get(user.id, (user, [], None))
+        if handle is not None:
+            handle.cancel()
+        lines.append(content)
+        handle = self.bot.loop.call_later(DIGEST_DELAY, self.send_digest, user.id)
+        self._digests[user.id] = (user, lines, handle)
+
+    def send_digest(self, user_id: int):
+        user, lines, _ = self._digests.pop(user_id)
+        self.send_pages(user, lines)
+
+    def reply(self, channel: discord.TextChannel, content: str):
+        """Queue a line for a message in a channel that collects lines for REPLY_DELAY seconds and is deleted again
+        after REPLY_LIFETIME seconds."""
+        lines = self._replies.get(channel.id)
+        if lines is None:
+            lines = self._replies[channel.id] = []
+            self.bot.loop.call_later(REPLY_DELAY, self.send_reply, channel)
+        lines.append(content)
+
+    def send_reply(self, channel: discord.TextChannel):
+        self.send_pages(channel, self._replies.pop(channel.id), delete_after=REPLY_LIFETIME)
+
+    async def send_messages(self):
+        while not self._messages.empty():
+            destination, content, delete_after, queued_at = self._messages.get_nowait()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=max(queued_at + DM_MAX_DELAY - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await destination.send(content, delete_after=delete_after)
+            except discord.HTTPException:
+                pass
+            except Exception:
+                # Keep sending the other messages
+                print(f'Couldn\'t send a message to {destination!r}:')
+                traceback.print_exc()
@@ -5,6 +5,28 @@ from .formats import plural, human_join
 from discord.ext import commands
 import re
 
+# e.g. 2020-12-31, 2020-12-31 18:00 or 2020-12-31T18:00:30
+ISO_DATETIME = re.compile(r'(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})'
+                          r'(?:[T ](?P<clock>[0-9]{2}:[0-9]{2}(?::[0-9]{2})?))?(?=\s|$)')
+# e.g. the "pm" of 2020-12-31 06:00 pm
+MERIDIEM = re.compile(r'\s*[ap]\.?m\b\.?', re.IGNORECASE)
+
+
+def parse_iso(match, now):
+    """The datetime an ISO_DATETIME match stands for, or None if it isn't a real date.
+
+    Without a time of day it is at the current time, like parsedatetime does.
+    """
+    date, clock = match.group('date', 'clock')
+    try:
+        if clock is None:
+            dt = datetime.datetime.strptime(date, '%Y-%m-%d')
+            return dt.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
+        return datetime.datetime.strptime(f'{date} {clock}', '%Y-%m-%d %H:%M:%S' if clock.count(':') == 2
+                                          else '%Y-%m-%d %H:%M')
+    except ValueError:
+        return None
+
 
 class ShortTime:
     compiled = re.compile("""(?:(?P<years>[0-9])(?:years?|y))?             # e.g. 2y
@@ -21,9 +43,12 @@ class ShortTime:
         if match is None or not match.group(0):
             raise commands.BadArgument('invalid time provided')
 
-        data = {k: int(v) for k, v in match.groupdict(default=0).items()}
         now = now or datetime.datetime.utcnow()
-        self.dt = now + relativedelta(**data)
+        self.dt = now + self.delta(match)
+
+    @staticmethod
+    def delta(match):
+        return relativedelta(**{k: int(v) for k, v in match.groupdict(default=0).items()})
 
     @classmethod
     async def convert(cls, ctx, argument):
@@ -35,13 +60,16 @@ class HumanTime:
 
     def __init__(self, argument, *, now=None):
         now = now or datetime.datetime.utcnow()
-        dt, status = self.calendar.parseDT(argument, sourceTime=now)
-        if not status.hasDateOrTime:
-            raise commands.BadArgument('invalid time provided, try e.g. "tomorrow" or "3 days"')
+        match = ISO_DATETIME.fullmatch(argument.strip())
+        dt = match and parse_iso(match, now)
+        if dt is None:
+            dt, status = self.calendar.parseDT(argument, sourceTime=now)
+            if not status.hasDateOrTime:
+                raise commands.BadArgument('invalid time provided, try e.g. "tomorrow" or "3 days"')
 
-        if not status.hasTime:
-            # replace it with the current time
-            dt = dt.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
+            if not status.hasTime:
+                # replace it with the current time
+                dt = dt.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
 
         self.dt = dt
         self._past = dt < now
@@ -53,12 +81,11 @@ class HumanTime:
 
 class Time(HumanTime):
     def __init__(self, argument, *, now=None):
-        try:
-            o = ShortTime(argument, now=now)
-        except Exception as e:
-            super().__init__(argument)
+        match = ShortTime.compiled.fullmatch(argument)
+        if match is None or not match.group(0):
+            super().__init__(argument, now=now)
         else:
-            self.dt = o.dt
+            self.dt = (now or datetime.datetime.utcnow()) + ShortTime.delta(match)
             self._past = False
 
 
@@ -100,15 +127,24 @@ class UserFriendlyTime(commands.Converter):
 
     async def convert(self, ctx, argument):
         try:
-            calendar = HumanTime.calendar
             regex = ShortTime.compiled
             now = ctx.message.created_at
 
             match = regex.match(argument)
             if match is not None and match.group(0):
-                data = {k: int(v) for k, v in match.groupdict(default=0).items()}
                 remaining = argument[match.end():].strip()
-                self.dt = now + relativedelta(**data)
+                self.dt = now + ShortTime.delta(match)
+                return await self.check_constraints(ctx, now, remaining)
+
+            # a date alone may be followed by its time in words, e.g. "2020-12-31 at 6pm", leave those to nlp
+            match = ISO_DATETIME.match(argument)
+            if match is not None and match.group('clock') and not MERIDIEM.match(argument, match.end()):
+                dt = parse_iso(match, now)
+            else:
+                dt = None
+            if dt is not None:
+                remaining = argument[match.end():].strip()
+                self.dt = dt
                 return await self.check_constraints(ctx, now, remaining)
 
             # apparently nlp does not like "from now"
@@ -121,7 +157,7 @@ class UserFriendlyTime(commands.Converter):
                 if argument[0:6] in ('me to ', 'me in ', 'me at '):
                     argument = argument[6:]
 
-            elements = calendar.nlp(argument, sourceTime=now)
+            elements = HumanTime.calendar.nlp(argument, sourceTime=now)
             if elements is None or len(elements) == 0:
                 raise commands.BadArgument('Invalid time provided, try e.g. "tomorrow" or "3 days".')
 
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+import discord
+
+
+class UserNames:
+    """Resolves user IDs to names, for embeds listing lots of users.
+
+    Users in the gateway cache are used directly. Other users are fetched, at most `concurrency` at a time,
+    and their names are kept for `ttl` seconds in an LRU cache of at most `maxsize` names.
+    """
+
+    def __init__(self, bot, *, maxsize=2048, ttl=3600, concurrency=5):
+        self.bot = bot
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._names = OrderedDict()  # user ID -> (name, moment it expires)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def _get_cached(self, user_id: int):
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user.name
+
+        try:
+            name, expires = self._names[user_id]
+        except KeyError:
+            return None
+        if expires < time.monotonic():
+            del self._names[user_id]
+            return None
+        self._names.move_to_end(user_id)
+        return name
+
+    def _store(self, user_id: int, name: str):
+        self._names[user_id] = (name, time.monotonic() + self.ttl)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.maxsize:
+            self._names.popitem(last=False)
+
+    async def _fetch(self, user_id: int) -> str:
+        async with self._semaphore:
+            # Another resolve might have fetched it while we were waiting
+            name = self._get_cached(user_id)
+            if name is not None:
+                return name
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                return str(user_id)
+        self._store(user_id, user.name)
+        return user.name
+
+    async def resolve(self, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Get the names of several users at once, fetching the ones that aren't cached concurrently."""
+        names = {}
+        missing = []
+        for user_id in dict.fromkeys(int(user_id) for user_id in user_ids):
+            name = self._get_cached(user_id)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+            names.update(zip(missing, fetched))
+        return names